@@ -0,0 +1,53 @@
+import hashlib
+
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from recipes.counters import COUNTERS
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from users.models import User
+
+CACHE_KEY = 'auth_token:{}'
+CACHE_TIMEOUT = 60
+USER_COUNTERS = tuple(
+    f'user__{field}' for model, field, *_ in COUNTERS if model is User)
+
+
+def get_cache_key(key):
+    return CACHE_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def evict_token(key):
+    caches['local'].delete(get_cache_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кешированием пары (пользователь, токен)
+    в памяти процесса, без обращения к базе на каждый запрос. Сигналы
+    удаления токена (выход через djoser) и изменения пользователя
+    убирают запись в своем процессе; остальные процессы видят выход
+    не позже чем через CACHE_TIMEOUT секунд.
+
+    Счетчики пользователя меняются F()-выражениями без сигналов, поэтому
+    в кеш они не попадают: при чтении загружаются из базы, а save()
+    закешированного пользователя записывает только загруженные поля."""
+
+    def load_credentials(self, key):
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user').defer(
+                *USER_COUNTERS).get(key=key)
+        except model.DoesNotExist:
+            raise AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
+
+    def authenticate_credentials(self, key):
+        cache = caches['local']
+        cache_key = get_cache_key(key)
+        credentials = cache.get(cache_key)
+        if credentials is None:
+            credentials = self.load_credentials(key)
+            cache.set(cache_key, credentials, CACHE_TIMEOUT)
+        return credentials
@@ -0,0 +1,100 @@
+import threading
+import time
+from bisect import bisect_left
+
+from recipes.cache import get_version
+from recipes.models import Ingredient
+
+NGRAM = 3
+INDEX_TTL = 5 * 60
+
+
+def ngrams(value):
+    return {value[i:i + NGRAM] for i in range(len(value) - NGRAM + 1)}
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Имена хранятся отсортированными в casefold-виде: совпадения по началу
+    строки ищутся бинарным поиском, вхождения подстроки — по триграммам.
+    Индекс перестраивается при смене версии 'ingredients' в общем кеше,
+    которую меняют сигналы сохранения/удаления Ingredient в любом
+    процессе и upload_data, и не реже раза в INDEX_TTL секунд. С общим
+    кешем версия сверяется не чаще раза в VERSION_CHECK_INTERVAL секунд
+    (recipes.cache), так что подсказки не обращаются к базе."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = None
+
+    def build(self, version):
+        ingredients = sorted(
+            Ingredient.objects.all(),
+            key=lambda ingredient: (ingredient.name.casefold(),
+                                    ingredient.measurement_unit, ingredient.id)
+        )
+        keys = [ingredient.name.casefold() for ingredient in ingredients]
+        grams = {}
+        for position, key in enumerate(keys):
+            for gram in ngrams(key):
+                grams.setdefault(gram, []).append(position)
+        return {
+            'version': version,
+            'built': time.monotonic(),
+            'ingredients': ingredients,
+            'keys': keys,
+            'grams': grams,
+        }
+
+    def get_state(self):
+        version = get_version('ingredients')
+        state = self.state
+        if (state is None or state['version'] != version
+                or time.monotonic() - state['built'] > INDEX_TTL):
+            with self.lock:
+                state = self.state
+                if (state is None or state['version'] != version
+                        or time.monotonic() - state['built'] > INDEX_TTL):
+                    state = self.state = self.build(version)
+        return state
+
+    def prefix_positions(self, state, query):
+        keys = state['keys']
+        position = bisect_left(keys, query)
+        while position < len(keys) and keys[position].startswith(query):
+            yield position
+            position += 1
+
+    def substring_positions(self, state, query):
+        keys = state['keys']
+        if len(query) < NGRAM:
+            candidates = range(len(keys))
+        else:
+            postings = sorted(
+                (state['grams'].get(gram, ()) for gram in ngrams(query)),
+                key=len
+            )
+            candidates = set(postings[0]).intersection(*postings[1:])
+            candidates = sorted(candidates)
+        for position in candidates:
+            key = keys[position]
+            if query in key and not key.startswith(query):
+                yield position
+
+    def search(self, query, limit=None):
+        """Возвращает ингредиенты: сначала совпавшие по началу названия,
+        затем содержащие подстроку; внутри групп — по алфавиту."""
+        state = self.get_state()
+        query = query.casefold()
+        result = []
+        for positions in (self.prefix_positions(state, query),
+                          self.substring_positions(state, query)):
+            for position in positions:
+                if limit is not None and len(result) >= limit:
+                    return result
+                result.append(state['ingredients'][position])
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,157 @@
+import threading
+import time
+
+from recipes.bitmaps import (bitmap, count_planes, exact_counts,
+                             highest_bits, popcount)
+from recipes.cache import bump_version, get_version
+from recipes.models import RecipeIngredient
+
+VERSION_NAME = 'recipe_ingredients'
+INDEX_TTL = 5 * 60
+MAX_INGREDIENTS = 100
+
+
+class Ranking:
+    """Рецепты по убыванию (покрытие, число совпавших, id) в виде
+    кортежей для постраничного вывода. Рецепты с одинаковыми покрытием
+    и числом совпадений лежат в одной битовой маске: срез извлекает
+    только биты нужной страницы."""
+    def __init__(self, groups):
+        self.groups = sorted(groups, key=lambda group: group[:2],
+                             reverse=True)
+        union = 0
+        for _, _, mask in self.groups:
+            union |= mask
+        self.length = popcount(union)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(self.length)
+        result = []
+        for coverage, count, mask in self.groups:
+            if stop <= 0:
+                break
+            size = popcount(mask)
+            if start < size:
+                result.extend(
+                    (coverage, count, recipe_id) for recipe_id in
+                    highest_bits(mask, start, min(stop, size) - start))
+            start = max(start - size, 0)
+            stop -= size
+        return result
+
+
+class CookableIndex:
+    """Инвертированный индекс «ингредиент → рецепты» в памяти процесса
+    для подбора рецептов по имеющимся продуктам.
+
+    Рецепты каждого ингредиента и рецепты с одинаковым числом
+    ингредиентов хранятся битовыми масками по id рецепта. Число
+    совпадений считается побитовым сложением масок выбранных
+    ингредиентов, покрытие — пересечением с масками по размеру рецепта,
+    поэтому ранжирование стоит сотен операций над масками, а не прохода
+    по рецептам. Записи рецептов через API применяются к индексу процесса
+    после фиксации транзакции. Версия 'recipe_ingredients' хранится в
+    общем кеше (CACHES), поэтому записи в других процессах, импорт и
+    генерация данных перестраивают индекс при следующем поиске; кроме
+    того, он перестраивается не реже раза в INDEX_TTL секунд.
+
+    Запись не меняет словари состояния: update собирает новые и
+    подменяет self.state одним присваиванием, поэтому поиск без
+    блокировки видит целиком либо старое, либо новое состояние."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = None
+
+    def build(self, version):
+        members = {}
+        rows = RecipeIngredient.objects.order_by().values_list(
+            'recipe_id', 'ingredient_id')
+        for recipe_id, ingredient_id in rows.iterator():
+            members.setdefault(recipe_id, set()).add(ingredient_id)
+        length = max(members, default=0) + 1
+        postings, sizes = {}, {}
+        for recipe_id, ingredient_ids in members.items():
+            for ingredient_id in ingredient_ids:
+                postings.setdefault(ingredient_id, []).append(recipe_id)
+            sizes.setdefault(len(ingredient_ids), []).append(recipe_id)
+        return {
+            'version': version,
+            'built': time.monotonic(),
+            'postings': {ingredient_id: bitmap(recipe_ids, length)
+                         for ingredient_id, recipe_ids in postings.items()},
+            'sizes': {size: bitmap(recipe_ids, length)
+                      for size, recipe_ids in sizes.items()},
+            'members': {recipe_id: frozenset(ingredient_ids)
+                        for recipe_id, ingredient_ids in members.items()},
+        }
+
+    def is_stale(self, state, version):
+        return (state is None or state['version'] != version
+                or time.monotonic() - state['built'] > INDEX_TTL)
+
+    def get_state(self):
+        version = get_version(VERSION_NAME)
+        state = self.state
+        if self.is_stale(state, version):
+            with self.lock:
+                state = self.state
+                if self.is_stale(state, version):
+                    state = self.state = self.build(version)
+        return state
+
+    def update(self, recipe_id, ingredient_ids=()):
+        """Заменяет состав рецепта в индексе; пустой состав удаляет
+        рецепт. Если индекс процесса уже отстал от общей версии,
+        он просто будет перестроен при следующем поиске."""
+        with self.lock:
+            state = self.state
+            current = state is not None and not self.is_stale(
+                state, get_version(VERSION_NAME))
+            version = bump_version(VERSION_NAME)
+            if not current:
+                return
+            ingredient_ids = frozenset(ingredient_ids)
+            previous = state['members'].get(recipe_id, frozenset())
+            postings, sizes, members = (dict(state['postings']),
+                                        dict(state['sizes']),
+                                        dict(state['members']))
+            bit = 1 << recipe_id
+            for ingredient_id in previous - ingredient_ids:
+                postings[ingredient_id] &= ~bit
+            for ingredient_id in ingredient_ids - previous:
+                postings[ingredient_id] = postings.get(ingredient_id, 0) | bit
+            if len(previous) != len(ingredient_ids):
+                if previous:
+                    sizes[len(previous)] &= ~bit
+                if ingredient_ids:
+                    sizes[len(ingredient_ids)] = (
+                        sizes.get(len(ingredient_ids), 0) | bit)
+            if ingredient_ids:
+                members[recipe_id] = ingredient_ids
+            else:
+                members.pop(recipe_id, None)
+            self.state = {**state, 'version': version, 'postings': postings,
+                          'sizes': sizes, 'members': members}
+
+    def rank(self, ingredient_ids, min_coverage=0):
+        """Возвращает Ranking рецептов хотя бы с одним совпавшим
+        ингредиентом и покрытием не ниже min_coverage."""
+        state = self.get_state()
+        planes = count_planes(
+            state['postings'].get(ingredient_id, 0)
+            for ingredient_id in set(ingredient_ids))
+        groups = []
+        for count, matched in exact_counts(planes):
+            for size, recipes in state['sizes'].items():
+                if size >= count and count / size >= min_coverage:
+                    groups.append((count / size, count, matched & recipes))
+        return Ranking(group for group in groups if group[2])
+
+
+cookable_index = CookableIndex()
@@ -1,6 +1,7 @@
 from django.db.models import BooleanField, ExpressionWrapper, Q
 from django_filters.rest_framework import FilterSet, filters
 from recipes.models import Ingredient, Recipe
+from recipes.search import search_recipes
 
 
 class IngredientFilter(FilterSet):
@@ -24,11 +25,15 @@ class IngredientFilter(FilterSet):
 
 
 class RecipeFilter(FilterSet):
-    """Фильтр рецептов по автору/тегу/подписке/наличию в списке покупок"""
+    """Фильтр рецептов по автору/тегу/подписке/наличию в списке покупок
+    и полнотекстовый поиск по названию и описанию (?search=)"""
     tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.OrderingFilter(
+        fields=('pub_date', 'favorites_count', 'in_carts_count'))
 
     class Meta:
         model = Recipe
@@ -43,3 +48,8 @@ class RecipeFilter(FilterSet):
         if value and self.request.user.is_authenticated:
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Результаты упорядочены по релевантности, если не задан
+        параметр ordering."""
+        return search_recipes(queryset, value)
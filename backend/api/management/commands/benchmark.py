@@ -0,0 +1,318 @@
+import base64
+import io
+import json
+import math
+import random
+import re
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (CaptureQueriesContext,
+                               setup_test_environment)
+from django.utils import timezone
+from PIL import Image
+from recipes import fake_data
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Follow, User
+
+PERCENTILES = (50, 90, 95, 99)
+RECIPE_NAME = 'Рецепт для замера'
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) SQL"')
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу для отсортированного списка."""
+    if not values:
+        return None
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+def small_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (200, 120, 40)).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode('ascii'))
+
+
+class LocalTransport:
+    """Запросы через тестовый клиент в этом же процессе;
+    число SQL-запросов считается напрямую. Тестовое окружение добавляет
+    'testserver' в ALLOWED_HOSTS, иначе каждый ответ - 400."""
+    def __init__(self, token):
+        self.token = token
+        setup_test_environment()
+
+    def request(self, method, path, data=None):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        kwargs = {} if data is None else {'data': data, 'format': 'json'}
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(path, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return response.status_code, len(queries)
+
+
+class HTTPTransport:
+    """Запросы к запущенному серверу; число SQL-запросов берется
+    из заголовка Server-Timing, если включена инструментация."""
+    def __init__(self, token, url):
+        self.token = token
+        self.url = url.rstrip('/')
+
+    def request(self, method, path, data=None):
+        request = urllib.request.Request(
+            self.url + path, method=method.upper(),
+            data=None if data is None else json.dumps(data).encode('utf-8'),
+            headers={'Authorization': f'Token {self.token}',
+                     'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                status, headers = response.status, response.headers
+        except urllib.error.HTTPError as error:
+            error.read()
+            status, headers = error.code, error.headers
+        match = SERVER_TIMING_QUERIES.search(
+            headers.get('Server-Timing', ''))
+        return status, int(match.group(1)) if match else None
+
+
+class Scenarios:
+    """Типовые запросы API; каждый сценарий возвращает
+    (метод, путь, тело) для очередного запроса."""
+    def __init__(self, user, rng, ingredients_per_recipe):
+        self.user = user
+        self.rng = rng
+        self.ingredients_per_recipe = ingredients_per_recipe
+        self.recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        self.author_ids = list(Follow.objects.filter(
+            user=user).values_list('author_id', flat=True)) or [user.id]
+        self.tags = list(Tag.objects.values_list('slug', flat=True))
+        self.ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True))
+        self.prefixes = [name[:3] for name in Ingredient.objects.values_list(
+            'name', flat=True)[:200]]
+        self.tag_ids = list(Tag.objects.values_list('id', flat=True))
+        self.image = small_image()
+        self.own_recipe_id = None
+        if not (self.recipe_ids and self.tags and self.ingredient_ids):
+            raise CommandError('Нет данных для замеров, запустите с --seed')
+
+    def all(self):
+        return {
+            'recipes.list': lambda: ('get', '/api/recipes/'),
+            'recipes.list.cursor': lambda: ('get', '/api/recipes/?cursor='),
+            'recipes.detail': lambda: (
+                'get', f'/api/recipes/{self.rng.choice(self.recipe_ids)}/'),
+            'recipes.trending': lambda: ('get', '/api/recipes/trending/'),
+            'recipes.filter.tags': lambda: (
+                'get', '/api/recipes/?' + '&'.join(
+                    f'tags={slug}' for slug in self.rng.sample(
+                        self.tags, min(2, len(self.tags))))),
+            'recipes.filter.author': lambda: (
+                'get',
+                f'/api/recipes/?author={self.rng.choice(self.author_ids)}'),
+            'recipes.filter.is_favorited': lambda: (
+                'get', '/api/recipes/?is_favorited=1'),
+            'recipes.filter.is_in_shopping_cart': lambda: (
+                'get', '/api/recipes/?is_in_shopping_cart=1'),
+            'recipes.search': lambda: (
+                'get', '/api/recipes/?search=' + urllib.parse.quote(
+                    self.rng.choice(fake_data.WORDS))),
+            'recipes.cookable': lambda: (
+                'get', '/api/recipes/cookable/?' + '&'.join(
+                    f'ingredients={pk}' for pk in self.rng.sample(
+                        self.ingredient_ids,
+                        min(10, len(self.ingredient_ids))))),
+            'users.subscriptions': lambda: (
+                'get', '/api/users/subscriptions/?recipe_limit=3'),
+            'ingredients.autocomplete': lambda: (
+                'get', '/api/ingredients/?limit=10&name='
+                + self.rng.choice(self.prefixes)),
+            'recipes.create': lambda: (
+                'post', '/api/recipes/', self.recipe_data()),
+            'recipes.update': lambda: (
+                'put', f'/api/recipes/{self.get_own_recipe_id()}/',
+                self.recipe_data()),
+            'shopping_cart.txt': lambda: (
+                'get', '/api/recipes/download_shopping_cart/?format=txt'),
+            'shopping_cart.pdf': lambda: (
+                'get', '/api/recipes/download_shopping_cart/?format=pdf'),
+        }
+
+    def recipe_data(self):
+        ingredient_ids = self.rng.sample(
+            self.ingredient_ids,
+            min(self.ingredients_per_recipe, len(self.ingredient_ids)))
+        return {
+            'name': RECIPE_NAME,
+            'text': 'Описание',
+            'cooking_time': self.rng.randint(1, 120),
+            'image': self.image,
+            'tags': self.rng.sample(self.tag_ids, 1),
+            'ingredients': [{'id': pk, 'amount': self.rng.randint(1, 500)}
+                            for pk in ingredient_ids],
+        }
+
+    def get_own_recipe_id(self):
+        if self.own_recipe_id is None:
+            recipe = Recipe.objects.create(
+                author=self.user, name=RECIPE_NAME, text='Описание',
+                cooking_time=1, image=fake_data.IMAGE)
+            self.own_recipe_id = recipe.id
+        return self.own_recipe_id
+
+    def cleanup(self):
+        Recipe.objects.filter(author=self.user, name=RECIPE_NAME).delete()
+        self.own_recipe_id = None
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержки (перцентили), пропускную способность '
+            'и число SQL-запросов основных сценариев API и сохраняет '
+            'результат в JSON для сравнения между коммитами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true',
+                            help='Пересоздать синтетический набор данных.')
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--follows', type=int, default=10)
+        parser.add_argument('--favorites', type=int, default=20)
+        parser.add_argument('--carts', type=int, default=5)
+        parser.add_argument('--random-seed', type=int, default=0)
+        parser.add_argument('--user', help='email пользователя для запросов')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Число замеряемых запросов на сценарий.')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--scenario', action='append',
+                            help='Запустить только указанные сценарии.')
+        parser.add_argument('--url', help='Адрес запущенного сервера; '
+                                          'по умолчанию запросы выполняются '
+                                          'в этом процессе.')
+        parser.add_argument('--output', help='Файл для результатов в JSON.')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options)
+        user = self.get_user(options['user'])
+        token = Token.objects.get_or_create(user=user)[0].key
+        transport = (HTTPTransport(token, options['url']) if options['url']
+                     else LocalTransport(token))
+        scenarios = Scenarios(user, random.Random(options['random_seed']),
+                              options['ingredients_per_recipe'])
+        selected = scenarios.all()
+        if options['scenario']:
+            unknown = set(options['scenario']) - set(selected)
+            if unknown:
+                raise CommandError(f'Неизвестные сценарии: {unknown}')
+            selected = {name: selected[name] for name in options['scenario']}
+        results = {}
+        try:
+            for name, scenario in selected.items():
+                results[name] = self.measure(
+                    name, transport, scenario, options)
+                self.report(name, results[name])
+        finally:
+            scenarios.cleanup()
+        self.write_results(results, options)
+
+    def seed(self, options):
+        started = time.monotonic()
+        fake_data.delete_fake_data()
+        fake_data.generate(
+            users=options['users'], recipes=options['recipes'],
+            ingredients_per_recipe=options['ingredients_per_recipe'],
+            follows=options['follows'], favorites=options['favorites'],
+            carts=options['carts'], seed=options['random_seed'])
+        self.stdout.write(self.style.SUCCESS(
+            f'=== Данные созданы за {time.monotonic() - started:.1f} с ==='))
+
+    def get_user(self, email):
+        if email:
+            user = User.objects.filter(email=email).first()
+        else:
+            user = User.objects.filter(
+                username__startswith=f'{fake_data.PREFIX}_'
+            ).order_by('id').first()
+        if user is None:
+            raise CommandError('Нет пользователя для замеров, '
+                               'запустите с --seed или укажите --user')
+        return user
+
+    def measure(self, name, transport, scenario, options):
+        def run(_):
+            method, path, *data = scenario()
+            started = time.perf_counter()
+            status, queries = transport.request(method, path, *data)
+            if status >= 400:
+                raise CommandError(
+                    f'{name}: {method.upper()} {path} вернул {status}, '
+                    'замеры ответов с ошибкой не имеют смысла')
+            return time.perf_counter() - started, status, queries
+
+        for number in range(options['warmup']):
+            run(number)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            samples = list(pool.map(run, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+        latencies = sorted(sample[0] * 1000 for sample in samples)
+        queries = sorted(sample[2] for sample in samples
+                         if sample[2] is not None)
+        return {
+            'requests': len(samples),
+            'throughput_rps': round(len(samples) / elapsed, 2),
+            'latency_ms': dict(
+                {f'p{percent}': round(percentile(latencies, percent), 2)
+                 for percent in PERCENTILES},
+                mean=round(sum(latencies) / len(latencies), 2),
+                max=round(latencies[-1], 2)),
+            'queries': {
+                'min': queries[0], 'median': percentile(queries, 50),
+                'max': queries[-1]
+            } if queries else None,
+        }
+
+    def report(self, name, result):
+        latency = result['latency_ms']
+        queries = result['queries'] or {}
+        self.stdout.write(
+            f'{name:<36} {result["throughput_rps"]:>8} rps  '
+            f'p50 {latency["p50"]:>8} мс  p95 {latency["p95"]:>8} мс  '
+            f'p99 {latency["p99"]:>8} мс  SQL {queries.get("median")}')
+
+    def write_results(self, results, options):
+        document = {
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'transport': 'http' if options['url'] else 'local',
+            'concurrency': options['concurrency'],
+            'requests': options['requests'],
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+                'follows': Follow.objects.count(),
+                'favorites': Favorite.objects.count(),
+                'shopping_cart': ShoppingCart.objects.count(),
+            },
+            'scenarios': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(document, file, ensure_ascii=False, indent=2,
+                          sort_keys=True)
+                file.write('\n')
+            self.stdout.write(self.style.SUCCESS(
+                f'=== Результаты сохранены в {options["output"]} ==='))
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+from api.filters import RecipeFilter
+from api.shopping_list import get_shopping_list
+from api.views.users import UsersViewSet
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Выводит планы выполнения (EXPLAIN ANALYZE в PostgreSQL) '
+            'типовых запросов API, чтобы замечать регрессии индексов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='email пользователя для запросов')
+        parser.add_argument('--recipe-limit', type=int, default=3)
+
+    def get_user(self, email):
+        if email:
+            user = User.objects.filter(email=email).first()
+        else:
+            user = (User.objects.filter(shopping_cart__isnull=False).first()
+                    or User.objects.first())
+        if user is None:
+            raise CommandError('Нет пользователя для построения запросов')
+        return user
+
+    def filtered(self, user, **data):
+        request = SimpleNamespace(user=user)
+        return RecipeFilter(
+            data, queryset=Recipe.objects.with_user_flags(user),
+            request=request).qs[:settings.REST_FRAMEWORK['PAGE_SIZE']]
+
+    def get_queries(self, user, recipe_limit):
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        authors = list(
+            UsersViewSet.get_subscriptions(user)[:page_size])
+        return (
+            ('RecipeViewSet.list',
+             Recipe.objects.with_user_flags(user)[:page_size]),
+            ('RecipeFilter: author', self.filtered(user, author=user.id)),
+            ('RecipeFilter: tags', self.filtered(user, tags=tags)),
+            ('RecipeFilter: is_favorited',
+             self.filtered(user, is_favorited=True)),
+            ('RecipeFilter: is_in_shopping_cart',
+             self.filtered(user, is_in_shopping_cart=True)),
+            ('download_shopping_cart', get_shopping_list(user)),
+            ('UsersViewSet.subscriptions',
+             UsersViewSet.get_subscriptions(user)[:page_size]),
+            ('UsersViewSet.subscriptions: recipes',
+             Recipe.objects.filter(author__in=authors).limited_per_author(
+                 recipe_limit)),
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        explain_options = {}
+        if connection.vendor == 'postgresql':
+            explain_options = {'analyze': True, 'buffers': True}
+        for title, queryset in self.get_queries(user,
+                                                options['recipe_limit']):
+            self.stdout.write(self.style.SUCCESS(f'=== {title} ==='))
+            self.stdout.write(queryset.explain(**explain_options))
@@ -0,0 +1,76 @@
+import threading
+from bisect import bisect_left
+
+PREFIX = 'foodgram'
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+HISTOGRAMS = (
+    ('request_duration_seconds', 'Время обработки запроса.',
+     DURATION_BUCKETS),
+    ('db_queries', 'Число SQL-запросов за запрос.', QUERY_BUCKETS),
+    ('db_duration_seconds', 'Время SQL-запросов за запрос.',
+     DURATION_BUCKETS),
+)
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами: наблюдение стоит
+    одного двоичного поиска и двух сложений."""
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, endpoint):
+        total = 0
+        labels = f'endpoint="{endpoint}"'
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {total}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {total}'
+
+
+class Metrics:
+    """Статистика запросов по эндпоинтам в памяти процесса."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.duplicates = {}
+
+    def observe(self, endpoint, duration, queries, db_duration, duplicated):
+        with self.lock:
+            histograms = self.endpoints.get(endpoint)
+            if histograms is None:
+                histograms = self.endpoints[endpoint] = tuple(
+                    Histogram(buckets) for _, _, buckets in HISTOGRAMS)
+                self.duplicates[endpoint] = 0
+            for histogram, value in zip(
+                    histograms, (duration, queries, db_duration)):
+                histogram.observe(value)
+            self.duplicates[endpoint] += duplicated
+
+    def render(self):
+        """Текстовый формат экспозиции Prometheus."""
+        lines = []
+        with self.lock:
+            for index, (name, description, _) in enumerate(HISTOGRAMS):
+                name = f'{PREFIX}_{name}'
+                lines += (f'# HELP {name} {description}',
+                          f'# TYPE {name} histogram')
+                for endpoint, histograms in sorted(self.endpoints.items()):
+                    lines.extend(histograms[index].lines(name, endpoint))
+            name = f'{PREFIX}_duplicate_queries_total'
+            lines += (f'# HELP {name} Запросы с повторяющимся SQL (N+1).',
+                      f'# TYPE {name} counter')
+            lines.extend(f'{name}{{endpoint="{endpoint}"}} {count}'
+                         for endpoint, count in sorted(
+                             self.duplicates.items()))
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
@@ -0,0 +1,76 @@
+import logging
+import time
+from collections import Counter
+
+from api.metrics import metrics
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryRecorder:
+    """Обертка выполнения SQL: считает запросы, их время
+    и повторы одного и того же текста запроса."""
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+
+class InstrumentationMiddleware:
+    """Время запроса, число и время SQL-запросов по эндпоинтам.
+    Включается настройкой INSTRUMENTATION; повторяющиеся запросы
+    (признак N+1) пишутся в лог, итоги отдаются в Server-Timing."""
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = settings.INSTRUMENTATION_DUPLICATE_THRESHOLD
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        endpoint = getattr(request, 'instrumentation_endpoint', 'unresolved')
+        duplicated = self.check_duplicates(endpoint, recorder)
+        metrics.observe(endpoint, duration, recorder.count,
+                        recorder.duration, duplicated)
+        response['Server-Timing'] = (
+            f'app;dur={duration * 1000:.1f}, '
+            f'db;dur={recorder.duration * 1000:.1f};'
+            f'desc="{recorder.count} SQL"'
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None:
+            name = f'{view_func.__module__}.{view_func.__name__}'
+        else:
+            actions = getattr(view_func, 'actions', None) or {}
+            method = request.method.lower()
+            name = f'{view_class.__name__}.{actions.get(method, method)}'
+        request.instrumentation_endpoint = name
+
+    def check_duplicates(self, endpoint, recorder):
+        if not recorder.statements:
+            return False
+        sql, count = recorder.statements.most_common(1)[0]
+        if count < self.threshold:
+            return False
+        logger.warning('%s: запрос выполнен %s раз (N+1?): %s',
+                       endpoint, count, sql[:300])
+        return True
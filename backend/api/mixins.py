@@ -0,0 +1,59 @@
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from recipes.cache import get_version
+
+CACHE_TIMEOUT = 5 * 60
+
+
+class CachedReferenceMixin:
+    """Кеширует готовый JSON справочных данных (теги, ингредиенты).
+
+    Ответы хранятся в памяти процесса (кеш local), а ключ кеша и ETag
+    строятся из версии набора данных cache_version_name в общем кеше.
+    Ее меняют сигналы сохранения/удаления записей после фиксации
+    транзакции и команды загрузки данных, в каком бы процессе они ни
+    выполнялись; версия — это время последнего изменения, оно же
+    отдается в Last-Modified.
+    """
+    cache_version_name = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, view, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return view(request, *args, **kwargs)
+        version = get_version(self.cache_version_name)
+        etag = f'"{self.cache_version_name}-{version}"'
+        last_modified = version // 1000
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.get_cached(
+                f'{etag}:{request.get_full_path()}',
+                view, request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def get_cached(self, key, view, request, *args, **kwargs):
+        cache = caches['local']
+        cached = cache.get(key)
+        if cached is None:
+            response = self.finalize_response(
+                request, view(request, *args, **kwargs), *args, **kwargs)
+            response.render()
+            if response.status_code != 200:
+                return response
+            cached = (response.content, response['Content-Type'])
+            cache.set(key, cached, CACHE_TIMEOUT)
+        content, content_type = cached
+        return HttpResponse(content, content_type=content_type)
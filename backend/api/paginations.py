@@ -1,5 +1,69 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+
+from django.db import connections
+from django.db.models import QuerySet
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+
+def estimate_count(queryset):
+    """Оценка числа строк из статистики PostgreSQL (pg_class.reltuples).
+    Возвращает None для отфильтрованных кверисетов и других СУБД."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE relname = %s',
+            [queryset.model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class KeysetPagination(CursorPagination):
+    """Постраничный вывод по ключу без OFFSET и COUNT(*).
+    Порядок задается атрибутом cursor_ordering вьюсета."""
+    page_size_query_param = 'limit'
+    ordering = 'pk'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', self.ordering)
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = estimate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
 
 
 class LimitPagination(PageNumberPagination):
+    """Постраничный вывод по номеру страницы; при наличии параметра
+    ?cursor= (в том числе пустого) переключается на KeysetPagination.
+    Списки, ранжированные не в базе, выводятся только по страницам."""
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if (self.cursor_query_param in request.query_params
+                and isinstance(queryset, QuerySet)):
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
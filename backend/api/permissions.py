@@ -6,4 +6,5 @@ class IsAuthorOrReadOnly(BasePermission):
         return request.user.is_authenticated or request.method in SAFE_METHODS
 
     def has_object_permission(self, request, view, obj):
-        return obj.author == request.user or request.method in SAFE_METHODS
+        return (obj.author_id == request.user.id
+                or request.method in SAFE_METHODS)
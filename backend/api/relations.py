@@ -0,0 +1,59 @@
+from collections import defaultdict
+
+from django.db import models
+from recipes.models import Favorite, ShoppingCart
+from rest_framework import serializers
+from users.models import Follow
+
+RELATIONS = {
+    'favorited': (Favorite, 'recipe_id'),
+    'in_shopping_cart': (ShoppingCart, 'recipe_id'),
+    'subscribed': (Follow, 'author_id'),
+}
+
+
+class RelationSnapshot:
+    """Связи текущего пользователя на время одного запроса.
+    Идентификаторы объектов страницы регистрируются заранее,
+    и каждый вид связи загружается одним запросом при первом обращении."""
+    def __init__(self, user):
+        self.user = user
+        self.pending = defaultdict(set)
+        self.checked = defaultdict(set)
+        self.related = defaultdict(set)
+
+    def prime(self, kind, ids):
+        self.pending[kind].update(ids)
+
+    def has(self, kind, pk):
+        if self.user is None or self.user.is_anonymous:
+            return False
+        if pk not in self.checked[kind]:
+            self.load(kind, self.pending.pop(kind, set()) | {pk})
+        return pk in self.related[kind]
+
+    def load(self, kind, ids):
+        ids = ids - self.checked[kind]
+        model, field = RELATIONS[kind]
+        self.related[kind].update(model.objects.filter(
+            user=self.user, **{f'{field}__in': ids}
+        ).values_list(field, flat=True))
+        self.checked[kind].update(ids)
+
+
+def get_relations(context):
+    """Снимок связей, общий для всех сериализаторов с этим контекстом."""
+    if 'relations' not in context:
+        request = context.get('request')
+        context['relations'] = RelationSnapshot(
+            request.user if request is not None else None)
+    return context['relations']
+
+
+class RelationsListSerializer(serializers.ListSerializer):
+    """Перед выводом списка регистрирует его объекты в снимке связей."""
+    def to_representation(self, data):
+        iterable = list(
+            data.all() if isinstance(data, models.Manager) else data)
+        self.child.prime_relations(get_relations(self.context), iterable)
+        return super().to_representation(iterable)
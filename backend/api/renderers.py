@@ -0,0 +1,37 @@
+from api.shopping_list import render_lines
+from rest_framework.renderers import BaseRenderer
+
+
+def error_lines(data):
+    if isinstance(data, dict):
+        return [f'{key}: {value}' for key, value in data.items()]
+    return [str(data)]
+
+
+class PDFRenderer(BaseRenderer):
+    """Отдает PDF; ответы с ошибками рисуются в PDF построчно."""
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return render_lines(error_lines(data), title='Ошибка')
+
+
+class PlainTextRenderer(BaseRenderer):
+    """Отдает текст; ответы с ошибками выводятся построчно."""
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return '\n'.join(error_lines(data)).encode(self.charset)
+
+
+class CSVRenderer(PlainTextRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
@@ -1,25 +1,94 @@
 import base64
+import binascii
+import re
+from collections import Counter
+from tempfile import SpooledTemporaryFile
 
+from api.cookable import MAX_INGREDIENTS, cookable_index
+from api.relations import RelationsListSerializer, get_relations
 from api.serializers.users import UsersSerializer
-from django.core.files.base import ContentFile
+from django.core.files import File
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from recipes.images import check_dimensions, rendition_names
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
+from recipes.similarity import TOP_K
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
+from tasks.queue import enqueue
+
+NOT_BASE64 = re.compile(r'[^A-Za-z0-9+/=]')
 
 
 class Base64ImageField(serializers.ImageField):
-    """Кастомное поле для кодирования изображения в base64."""
+    """Кастомное поле для кодирования изображения в base64.
+    Декодирует строку частями во временный файл и до полной проверки
+    изображения сверяет его размеры по заголовку. Как и b64decode
+    целиком, пропускает переносы строк и прочие символы вне алфавита;
+    хвост части, не кратный четырем символам, переходит в следующую."""
+    chunk_size = 64 * 1024
+    spool_size = 1024 * 1024
+
+    def decode(self, imgstr):
+        file = SpooledTemporaryFile(max_size=self.spool_size)
+        tail = ''
+        try:
+            for start in range(0, len(imgstr), self.chunk_size):
+                chunk = tail + NOT_BASE64.sub(
+                    '', imgstr[start:start + self.chunk_size])
+                end = len(chunk) - len(chunk) % 4
+                file.write(base64.b64decode(chunk[:end]))
+                tail = chunk[end:]
+            if tail:
+                file.write(base64.b64decode(tail))
+        except binascii.Error:
+            file.close()
+            raise ValidationError('Некорректное изображение в base64.')
+        return file
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='photo.' + ext)
+            data = File(self.decode(imgstr), name='photo.' + ext)
+            try:
+                fits = check_dimensions(data)
+            except Exception:
+                raise ValidationError('Файл не является изображением.')
+            if not fits:
+                raise ValidationError(
+                    'Изображение слишком большое по ширине или высоте.')
 
         return super().to_internal_value(data)
 
 
+class ImageRenditionsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии изображения рецепта; None, пока
+    фоновая задача их не создала (тогда клиент берет поле image)."""
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        image = recipe.image
+        if not image or not recipe.renditions_ready:
+            return None
+        request = self.context.get('request')
+        return {
+            size: {
+                extension: self.build_url(image.storage.url(name), request)
+                for extension, name in names.items()
+            }
+            for size, names in rendition_names(image.name).items()
+        }
+
+    def build_url(self, url, request):
+        if request is None:
+            return url
+        return request.build_absolute_uri(url)
+
+
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор для работы с тегами."""
     class Meta:
@@ -49,20 +118,78 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class ResolvePrimaryKeysMixin:
+    """Разрешает список первичных ключей одним запросом id__in
+    и сообщает обо всех повторах и отсутствующих ключах сразу."""
+    default_error_messages = {
+        'duplicates': 'Значения не должны повторяться: {ids}.',
+        'does_not_exist': 'Объекты не найдены: {ids}.',
+    }
+
+    def resolve(self, ids):
+        duplicates = sorted(
+            pk for pk, count in Counter(ids).items() if count > 1)
+        if duplicates:
+            self.fail('duplicates', ids=', '.join(map(str, duplicates)))
+        objects = self.queryset.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in objects]
+        if missing:
+            self.fail('does_not_exist', ids=', '.join(map(str, missing)))
+        return [objects[pk] for pk in ids]
+
+
+class PrimaryKeyListField(ResolvePrimaryKeysMixin, serializers.ListField):
+    """Список первичных ключей вместо поля с запросом на каждый ключ."""
+    child = serializers.IntegerField()
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        return self.resolve(super().to_internal_value(data))
+
+    def to_representation(self, value):
+        return [item.pk for item in value.all()]
+
+
+class AddIngredientListSerializer(ResolvePrimaryKeysMixin,
+                                  serializers.ListSerializer):
+    """Проверяет все ингредиенты рецепта одним запросом."""
+    queryset = Ingredient.objects.all()
+    default_error_messages = {
+        'duplicates': 'Ингредиенты должны быть уникальными: {ids}.',
+        'does_not_exist': 'Ингредиенты не найдены: {ids}.',
+    }
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = self.resolve([item['ingredient'] for item in items])
+        for item, ingredient in zip(items, ingredients):
+            item['ingredient'] = ingredient
+        return items
+
+
 class AddIngredientSerializer(serializers.ModelSerializer):
     """Сериализатор для добавления ингредиента при создании рецепта."""
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-        source='ingredient')
+    id = serializers.IntegerField(source='ingredient')
 
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount')
+        list_serializer_class = AddIngredientListSerializer
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериализатор создания рецепта.
-    Валидирует ингредиенты ответ возвращает GetRecipeSerializer."""
+    Ингредиенты и теги проверяются списком,
+    ответ возвращает GetRecipeSerializer."""
+    tags = PrimaryKeyListField(
+        queryset=Tag.objects.all(),
+        error_messages={
+            'duplicates': 'Теги не должны повторяться: {ids}.',
+            'does_not_exist': 'Теги не найдены: {ids}.',
+        })
     author = UsersSerializer(read_only=True)
     image = Base64ImageField()
     ingredients = AddIngredientSerializer(many=True)
@@ -72,52 +199,125 @@ class RecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'tags', 'author', 'ingredients',
                   'name', 'image', 'text', 'cooking_time')
 
-    def validate(self, data):
-        list_ingr = [item['ingredient'] for item in data['ingredients']]
-        all_ingredients, distinct_ingredients = (
-            len(list_ingr), len(set(list_ingr)))
-
-        if all_ingredients != distinct_ingredients:
-            raise ValidationError(
-                {'error': 'Ингредиенты должны быть уникальными'}
-            )
-        return data
-
     def get_ingredients(self, recipe, ingredients):
-        RecipeIngredient.objects.bulk_create(
+        recipe_ingredients = RecipeIngredient.objects.bulk_create(
             RecipeIngredient(
                 recipe=recipe,
                 ingredient=ingredient.get('ingredient'),
                 amount=ingredient.get('amount')
             ) for ingredient in ingredients)
+        self.written['recipe_ingredient'] = recipe_ingredients
+
+    def update_ingredients(self, recipe, ingredients):
+        """Сравнивает новый состав с текущим: меняет только количества,
+        добавляет новые строки и одним запросом удаляет лишние."""
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe)
+        }
+        recipe_ingredients, changed, created = [], [], []
+        for item in ingredients:
+            ingredient, amount = item['ingredient'], item['amount']
+            recipe_ingredient = current.pop(ingredient.id, None)
+            if recipe_ingredient is None:
+                recipe_ingredient = RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=amount)
+                created.append(recipe_ingredient)
+            else:
+                recipe_ingredient.ingredient = ingredient
+                if recipe_ingredient.amount != amount:
+                    recipe_ingredient.amount = amount
+                    changed.append(recipe_ingredient)
+            recipe_ingredients.append(recipe_ingredient)
+        if current:
+            RecipeIngredient.objects.filter(
+                pk__in=[item.pk for item in current.values()]).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        if created:
+            RecipeIngredient.objects.bulk_create(created)
+        self.written['recipe_ingredient'] = recipe_ingredients
+
+    def update_tags(self, recipe, tags, current=()):
+        """Добавляет и удаляет только изменившиеся связи с тегами."""
+        through = Recipe.tags.through
+        tag_ids = {tag.id for tag in tags}
+        removed = set(current) - tag_ids
+        if removed:
+            through.objects.filter(
+                recipe=recipe, tag_id__in=removed).delete()
+        through.objects.bulk_create(
+            through(recipe=recipe, tag=tag)
+            for tag in tags if tag.id not in current)
+
+    def index_ingredients(self, recipe):
+        """Обновляет индекс подбора рецептов по продуктам после
+        фиксации транзакции."""
+        ingredient_ids = [recipe_ingredient.ingredient_id for recipe_ingredient
+                          in self.written['recipe_ingredient']]
+        transaction.on_commit(
+            lambda: cookable_index.update(recipe.id, ingredient_ids))
+
+    @staticmethod
+    def schedule_similar(recipe):
+        """Ставит в очередь пересчет похожих рецептов; правки рецепта,
+        ждущие пересчета, сливаются в одну задачу."""
+        enqueue('recipes.similar', {'recipe_id': recipe.id},
+                idempotency_key=f'similar:{recipe.id}', repeat=True)
 
     @transaction.atomic
     def create(self, validated_data):
         user = self.context.get('request').user
+        self.written = {}
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(author=user,
                                        **validated_data)
-        recipe.tags.set(tags)
+        recipe.is_favorited = recipe.is_in_shopping_cart = False
+        self.update_tags(recipe, tags)
         self.get_ingredients(recipe, ingredients)
+        self.index_ingredients(recipe)
+        self.schedule_similar(recipe)
 
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-
-        instance.tags.set(tags)
-        self.get_ingredients(instance, ingredients)
-
-        return super().update(instance, validated_data)
+        self.written = {}
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+
+        if tags is not None:
+            self.update_tags(instance, tags, set(
+                Recipe.tags.through.objects.filter(
+                    recipe=instance).values_list('tag_id', flat=True)))
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
+            self.index_ingredients(instance)
+
+        # Счетчики и trending_score параллельно меняются F()-выражениями,
+        # поэтому строка сохраняется только по полям из запроса.
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        update_fields = [*validated_data, 'pub_date']
+        if 'image' in validated_data:
+            instance.renditions_ready = False
+            update_fields.append('renditions_ready')
+        instance.save(update_fields=update_fields)
+        if tags is not None or ingredients is not None:
+            self.schedule_similar(instance)
+        return instance
 
     def to_representation(self, instance):
-        context = {'request': self.context.get('request')}
-        return GetRecipeSerializer(instance, context=context).data
+        """Связи после записи читаются заново, как при обычном чтении,
+        поэтому теги и ингредиенты идут в том же порядке."""
+        prefetch_related_objects(
+            [instance], 'tags',
+            Prefetch('recipe_ingredient',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient')))
+        return GetRecipeSerializer(instance, context=self.context).data
 
 
 class GetRecipeSerializer(serializers.ModelSerializer):
@@ -128,24 +328,62 @@ class GetRecipeSerializer(serializers.ModelSerializer):
                                              source='recipe_ingredient')
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
+    image_renditions = ImageRenditionsField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text', 'cooking_time')
+                  'name', 'image', 'image_renditions', 'text',
+                  'cooking_time')
+        list_serializer_class = RelationsListSerializer
+
+    @staticmethod
+    def prime_relations(relations, recipes):
+        recipe_ids = [recipe.id for recipe in recipes]
+        relations.prime('favorited', recipe_ids)
+        relations.prime('in_shopping_cart', recipe_ids)
+        relations.prime('subscribed',
+                        (recipe.author_id for recipe in recipes))
 
     def get_is_favorited(self, object):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return object.favorite.filter(user=user).exists()
+        if hasattr(object, 'is_favorited'):
+            return object.is_favorited
+        return get_relations(self.context).has('favorited', object.id)
 
     def get_is_in_shopping_cart(self, object):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return object.shopping_cart.filter(user=user).exists()
+        if hasattr(object, 'is_in_shopping_cart'):
+            return object.is_in_shopping_cart
+        return get_relations(self.context).has('in_shopping_cart', object.id)
+
+
+class CookableRecipeSerializer(GetRecipeSerializer):
+    """Рецепт с долей его ингредиентов, которые есть у пользователя."""
+    coverage = serializers.FloatField(read_only=True)
+
+    class Meta(GetRecipeSerializer.Meta):
+        fields = GetRecipeSerializer.Meta.fields + ('coverage',)
+
+
+class IngredientQuerySerializer(serializers.Serializer):
+    """Параметры подсказок ингредиентов по началу названия."""
+    name = serializers.CharField(allow_blank=True, trim_whitespace=False)
+    limit = serializers.IntegerField(min_value=1, required=False)
+
+
+class CookableQuerySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся ингредиентам."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False,
+        max_length=MAX_INGREDIENTS)
+    min_coverage = serializers.FloatField(
+        min_value=0, max_value=1, default=0)
+
+
+class SimilarQuerySerializer(serializers.Serializer):
+    """Параметры выдачи похожих рецептов."""
+    limit = serializers.IntegerField(
+        min_value=1, max_value=TOP_K, default=TOP_K)
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -175,6 +413,8 @@ class ShoppingCartSerializer(FavoriteSerializer):
 
 class RecipeInfoSerializer(serializers.ModelSerializer):
     """Сериализатор для отображения краткой информации о рецепте."""
+    image_renditions = ImageRenditionsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
@@ -0,0 +1,20 @@
+from django.urls import reverse
+from rest_framework import serializers
+from tasks.models import Task
+
+
+class ExportTaskSerializer(serializers.ModelSerializer):
+    """Сериализатор статуса фоновой выгрузки списка покупок."""
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Task
+        fields = ('id', 'status', 'attempts', 'created', 'download')
+
+    def get_download(self, task):
+        if task.status != Task.DONE:
+            return None
+        url = reverse('api:recipe-shopping-cart-export-file',
+                      kwargs={'task_id': task.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
@@ -1,7 +1,8 @@
+from api.relations import RelationsListSerializer, get_relations
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework.exceptions import ValidationError
-from rest_framework.fields import SerializerMethodField
-from users.models import Follow, User
+from rest_framework.fields import ReadOnlyField, SerializerMethodField
+from users.models import User
 
 
 class UsersCreateSerializer(UserCreateSerializer):
@@ -41,18 +42,22 @@ class UsersSerializer(UserSerializer):
             'last_name',
             'is_subscribed'
         )
+        list_serializer_class = RelationsListSerializer
+
+    @staticmethod
+    def prime_relations(relations, users):
+        relations.prime('subscribed', (user.id for user in users))
 
     def get_is_subscribed(self, object):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=user, author=object.id).exists()
+        if hasattr(object, 'is_subscribed'):
+            return object.is_subscribed
+        return get_relations(self.context).has('subscribed', object.id)
 
 
 class FollowSerializer(UsersSerializer):
     """Сериализатор для добавления/удаления подписки, просмотра подписок."""
     recipes = SerializerMethodField(read_only=True)
-    recipes_count = SerializerMethodField(read_only=True)
+    recipes_count = ReadOnlyField()
 
     class Meta(UsersSerializer.Meta):
         fields = UsersSerializer.Meta.fields + ('recipes', 'recipes_count')
@@ -61,12 +66,12 @@ class FollowSerializer(UsersSerializer):
         from api.serializers.recipes import RecipeInfoSerializer
 
         request = self.context.get('request')
-        context = {'request': request}
-        recipe_limit = request.query_params.get('recipe_limit')
-        queryset = object.recipes.all()
-        if recipe_limit:
-            queryset = queryset[:int(recipe_limit)]
-        return RecipeInfoSerializer(queryset, context=context, many=True).data
-
-    def get_recipes_count(self, object):
-        return object.recipes.count()
+        if hasattr(object, 'latest_recipes'):
+            queryset = object.latest_recipes
+        else:
+            recipe_limit = request.query_params.get('recipe_limit')
+            queryset = object.recipes.all()
+            if recipe_limit:
+                queryset = queryset[:int(recipe_limit)]
+        return RecipeInfoSerializer(
+            queryset, context=self.context, many=True).data
@@ -0,0 +1,146 @@
+import csv
+import hashlib
+import io
+import json
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Sum
+from recipes.models import RecipeIngredient
+from reportlab.pdfbase import pdfmetrics, ttfonts
+from reportlab.pdfgen import canvas
+
+FONT_NAME = 'Arial'
+FONT_SIZE = 14
+TITLE = 'Список покупок'
+PAGE_TOP = 750
+PAGE_BOTTOM = 50
+LINE_HEIGHT = 25
+CHUNK_SIZE = 8192
+CACHE_TIMEOUT = 60 * 60 * 24
+
+export_storage = FileSystemStorage(location=settings.PRIVATE_ROOT)
+
+
+@lru_cache(maxsize=None)
+def register_font():
+    """Регистрирует шрифт в ReportLab один раз на процесс."""
+    pdfmetrics.registerFont(ttfonts.TTFont(
+        FONT_NAME, os.path.join(settings.BASE_DIR, 'data', 'arial.ttf')))
+
+
+def get_shopping_list(user):
+    """Суммирует ингредиенты из списка покупок пользователя на стороне БД."""
+    return RecipeIngredient.objects.filter(
+        recipe__shopping_cart__user=user
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).annotate(
+        total_amount=Sum('amount')
+    ).order_by('ingredient__name', 'ingredient__measurement_unit')
+
+
+def format_line(number, item):
+    return (f"{number}. {item['ingredient__name']} – "
+            f"{item['total_amount']} {item['ingredient__measurement_unit']}")
+
+
+def render_lines(lines, title=TITLE):
+    """Рисует строки в PDF, перенося их на новые страницы."""
+    register_font()
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer)
+    pdf.setFont(FONT_NAME, FONT_SIZE)
+    pdf.drawString(100, PAGE_TOP, title)
+    height = PAGE_TOP - 2 * LINE_HEIGHT
+    for line in lines:
+        if height < PAGE_BOTTOM:
+            pdf.showPage()
+            pdf.setFont(FONT_NAME, FONT_SIZE)
+            height = PAGE_TOP
+        pdf.drawString(80, height, line)
+        height -= LINE_HEIGHT
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def get_digest(items):
+    return hashlib.sha256(repr(list(items)).encode('utf-8')).hexdigest()
+
+
+def get_cache_key(items):
+    return f'shopping_list:pdf:{get_digest(items)}'
+
+
+def get_pdf(items):
+    """Возвращает PDF из кеша; ключ зависит только от содержимого списка."""
+    items = list(items)
+    key = get_cache_key(items)
+    content = cache.get(key)
+    if content is None:
+        content = render_lines(
+            format_line(number, item)
+            for number, item in enumerate(items, start=1))
+        cache.set(key, content, CACHE_TIMEOUT)
+    return content
+
+
+def iter_chunks(content):
+    for start in range(0, len(content), CHUNK_SIZE):
+        yield content[start:start + CHUNK_SIZE]
+
+
+def iter_txt(items):
+    yield f'{TITLE}\n\n'
+    for number, item in enumerate(items.iterator(), start=1):
+        yield format_line(number, item) + '\n'
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+    def write(self, value):
+        return value
+
+
+def iter_csv(items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for item in items.iterator():
+        yield writer.writerow((item['ingredient__name'],
+                               item['ingredient__measurement_unit'],
+                               item['total_amount']))
+
+
+def iter_json(items):
+    yield '['
+    for number, item in enumerate(items.iterator()):
+        yield (',' if number else '') + json.dumps({
+            'name': item['ingredient__name'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+            'amount': item['total_amount'],
+        }, ensure_ascii=False)
+    yield ']'
+
+
+def iter_pdf(items):
+    return iter_chunks(get_pdf(items))
+
+
+EXPORTERS = {
+    'pdf': iter_pdf,
+    'txt': iter_txt,
+    'csv': iter_csv,
+    'json': iter_json,
+}
+
+
+def export(items, format):
+    """Собирает выгрузку целиком в bytes (для фоновых задач)."""
+    return b''.join(
+        chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+        for chunk in EXPORTERS[format](items)
+    )
@@ -0,0 +1,36 @@
+from api.authentication import evict_token
+from api.cookable import cookable_index
+from api.shopping_list import export_storage
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import Recipe
+from rest_framework.authtoken.models import Token
+from tasks.models import Task
+from users.models import User
+
+
+@receiver((post_save, post_delete), sender=Token)
+def token_changed(instance, **kwargs):
+    evict_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_changed(instance, **kwargs):
+    for key in Token.objects.filter(user=instance).values_list(
+            'key', flat=True):
+        evict_token(key)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    recipe_id = instance.id
+    transaction.on_commit(lambda: cookable_index.update(recipe_id))
+
+
+@receiver(post_delete, sender=Task)
+def task_deleted(instance, **kwargs):
+    """Удаляет файл выгрузки вместе с задачей."""
+    result = instance.get_result()
+    if instance.name == 'shopping_list.export' and result:
+        export_storage.delete(result['file'])
@@ -0,0 +1,15 @@
+import uuid
+
+from api.shopping_list import export, export_storage, get_shopping_list
+from django.core.files.base import ContentFile
+from tasks.queue import task
+
+
+@task('shopping_list.export')
+def export_shopping_list(user_id, format, content_type):
+    """Сохраняет выгрузку в закрытое хранилище под случайным именем:
+    файл отдает только вьюха, проверяющая владельца задачи."""
+    content = export(get_shopping_list(user_id), format)
+    name = export_storage.save(
+        f'shopping_cart/{uuid.uuid4().hex}.{format}', ContentFile(content))
+    return {'file': name, 'content_type': content_type}
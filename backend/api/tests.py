@@ -0,0 +1,428 @@
+import base64
+import os
+import random
+import shutil
+import tempfile
+import textwrap
+from collections import Counter
+
+from api.cookable import MAX_INGREDIENTS, cookable_index
+from api.serializers.recipes import Base64ImageField
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from recipes import fake_data
+from recipes.bitmaps import bitmap, count_planes, exact_counts, highest_bits
+from recipes.management.commands.upload_data import upsert
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, SimilarRecipe, Tag)
+from recipes.similarity import rebuild_similar, refresh_similar
+from recipes.transfer import dump_recipe, load_recipes
+from rest_framework.test import APIClient
+from tasks.models import Task
+from tasks.queue import RUNNING_TIMEOUT, enqueue, run_next, task
+from users.models import Follow, User
+
+AUTHORS = 35
+
+
+def create_author(number):
+    return User.objects.create_user(
+        email=f'author{number}@example.com', username=f'author{number}',
+        password='pass12345word', first_name='Автор',
+        last_name=str(number))
+
+
+def create_recipe(author, ingredients, tags=(), name='Рецепт'):
+    recipe = Recipe.objects.create(
+        author=author, name=name, text='Описание', cooking_time=10,
+        image='recipes/test.png')
+    recipe.tags.set(tags)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+        for ingredient in ingredients)
+    return recipe
+
+
+def create_ingredients(count):
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+        for i in range(count))
+    return list(Ingredient.objects.order_by('pk'))
+
+
+class QueryCountTests(TestCase):
+    """Число запросов страницы не зависит от ее размера."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            password='pass12345word', first_name='Читатель',
+            last_name='Тестовый')
+        tags = [Tag.objects.create(name=f'Тег {i}', color='#FFFFFF',
+                                   slug=f'tag-{i}') for i in range(3)]
+        ingredients = create_ingredients(10)
+        for i in range(AUTHORS):
+            author = create_author(i)
+            Follow.objects.create(user=cls.user, author=author)
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {i}', text='Описание',
+                cooking_time=10, image='recipes/test.png')
+            recipe.tags.set(tags[:i % 3 + 1])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=i + 1)
+                for ingredient in ingredients[:i % 5 + 2])
+            if i % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if i % 3:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_page(self, url, limit, **params):
+        response = self.client.get(url, {'limit': limit, **params})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), limit)
+
+    def assertConstantQueries(self, url, **params):
+        with CaptureQueriesContext(connection) as small_page:
+            self.get_page(url, 5, **params)
+        with self.assertNumQueries(len(small_page)):
+            self.get_page(url, 30, **params)
+
+    def test_recipe_list(self):
+        self.assertConstantQueries('/api/recipes/')
+
+    def test_recipe_list_anonymous(self):
+        self.client.force_authenticate(None)
+        self.assertConstantQueries('/api/recipes/')
+
+    def test_subscriptions(self):
+        self.assertConstantQueries(
+            '/api/users/subscriptions/', recipe_limit=3)
+
+
+class FakeDataTests(TestCase):
+    """Удаление синтетических данных не зависит от их объема."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def generate_and_delete(self, users, recipes):
+        fake_data.generate(users=users, recipes=recipes)
+        with CaptureQueriesContext(connection) as queries:
+            deleted = fake_data.delete_fake_data()
+        self.assertFalse(fake_data.fake_users().exists())
+        return deleted, len(queries)
+
+    def test_delete_queries_constant(self):
+        small, small_queries = self.generate_and_delete(5, 20)
+        large, large_queries = self.generate_and_delete(30, 300)
+        self.assertGreater(large, small * 5)
+        self.assertEqual(small_queries, large_queries)
+
+    def test_placeholder_image_stored(self):
+        fake_data.generate(users=2, recipes=3)
+        recipe = Recipe.objects.filter(
+            author__in=fake_data.fake_users()).first()
+        self.assertTrue(recipe.image.storage.exists(recipe.image.name))
+
+
+class BitmapTests(SimpleTestCase):
+    """Операции над битовыми масками совпадают с операциями над
+    множествами."""
+
+    def test_exact_counts(self):
+        rng = random.Random(0)
+        sets = [set(rng.sample(range(300), rng.randint(0, 120)))
+                for _ in range(11)]
+        counts = Counter(item for items in sets for item in items)
+        expected = {}
+        for item, count in counts.items():
+            expected.setdefault(count, set()).add(item)
+        result = [
+            (count, set(highest_bits(mask, 0, 300)))
+            for count, mask in exact_counts(
+                count_planes(bitmap(items, 300) for items in sets))]
+        self.assertEqual(dict(result), expected)
+        self.assertEqual([count for count, _ in result],
+                         sorted(expected, reverse=True))
+
+    def test_highest_bits(self):
+        mask = bitmap([0, 5, 9, 64, 200], 201)
+        self.assertEqual(list(highest_bits(mask, 0, 10)),
+                         [200, 64, 9, 5, 0])
+        self.assertEqual(list(highest_bits(mask, 1, 2)), [64, 9])
+        self.assertEqual(list(highest_bits(mask, 5, 1)), [])
+
+
+class CookableTests(TestCase):
+    """Подбор рецептов по имеющимся ингредиентам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_author(0)
+        cls.ingredients = create_ingredients(5)
+        first, second, third, fourth, fifth = cls.ingredients
+        cls.full = create_recipe(author, [first, second])
+        cls.half = create_recipe(author, [first, second, third, fourth])
+        cls.third = create_recipe(author, [second, third, fourth])
+        create_recipe(author, [fifth])
+
+    def setUp(self):
+        cookable_index.state = None
+
+    def get_ranking(self, **params):
+        response = APIClient().get('/api/recipes/cookable/', {
+            'ingredients': [ingredient.pk
+                            for ingredient in self.ingredients[:2]],
+            **params})
+        self.assertEqual(response.status_code, 200)
+        return [(recipe['id'], recipe['coverage'])
+                for recipe in response.json()['results']]
+
+    def test_ranking(self):
+        self.assertEqual(self.get_ranking(), [
+            (self.full.pk, 1.0), (self.half.pk, 0.5),
+            (self.third.pk, 0.3333)])
+
+    def test_min_coverage(self):
+        self.assertEqual(self.get_ranking(min_coverage=0.5), [
+            (self.full.pk, 1.0), (self.half.pk, 0.5)])
+
+    def test_too_many_ingredients(self):
+        response = APIClient().get('/api/recipes/cookable/', {
+            'ingredients': list(range(1, MAX_INGREDIENTS + 2))})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.json())
+
+
+class SimilarityTests(TestCase):
+    """Таблица похожих рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_author(0)
+        ingredients = create_ingredients(8)
+        tags = [Tag.objects.create(name=f'Тег {i}', color='#FFFFFF',
+                                   slug=f'tag-{i}') for i in range(2)]
+        cls.recipe = create_recipe(author, ingredients[:4], tags[:1])
+        cls.twin = create_recipe(author, ingredients[:4], tags[:1])
+        cls.partial = create_recipe(author, ingredients[2:6], tags[1:])
+        cls.unrelated = create_recipe(author, ingredients[6:])
+
+    def neighbours(self, recipe):
+        return list(SimilarRecipe.objects.filter(
+            recipe=recipe).order_by('-score').values_list(
+                'similar_id', 'score'))
+
+    def test_identical_recipe_first(self):
+        rebuild_similar()
+        neighbours = [pk for pk, _ in self.neighbours(self.recipe)]
+        self.assertEqual(neighbours, [self.twin.pk, self.partial.pk])
+        response = APIClient().get(
+            f'/api/recipes/{self.recipe.pk}/similar/', {'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([recipe['id'] for recipe in response.json()],
+                         [self.twin.pk])
+
+    def test_refresh_matches_rebuild(self):
+        rebuild_similar()
+        recipes = (self.recipe, self.twin, self.partial, self.unrelated)
+        rebuilt = [self.neighbours(recipe) for recipe in recipes]
+        for recipe in recipes:
+            refresh_similar(recipe.pk)
+        for recipe, expected in zip(recipes, rebuilt):
+            refreshed = self.neighbours(recipe)
+            self.assertEqual([pk for pk, _ in refreshed],
+                             [pk for pk, _ in expected])
+            for (_, score), (_, expected_score) in zip(refreshed, expected):
+                self.assertAlmostEqual(score, expected_score)
+
+
+class KeysetPaginationTests(TestCase):
+    """Постраничный вывод по ключу при одинаковых датах публикации."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_author(0)
+        ingredients = create_ingredients(1)
+        for i in range(13):
+            create_recipe(author, ingredients, name=f'Рецепт {i}')
+        Recipe.objects.update(pub_date=timezone.now())
+
+    def test_every_recipe_once(self):
+        client = APIClient()
+        url, ids = '/api/recipes/?cursor=&limit=4', []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe['id'] for recipe in response.json()['results'])
+            url = response.json()['next']
+        self.assertEqual(ids, list(
+            Recipe.objects.order_by('-pk').values_list('pk', flat=True)))
+
+
+class TransferTests(TestCase):
+    """Повторная загрузка выгрузки рецептов ничего не дублирует."""
+
+    @classmethod
+    def setUpTestData(cls):
+        ingredients = create_ingredients(3)
+        tags = [Tag.objects.create(name=f'Тег {i}', color='#FFFFFF',
+                                   slug=f'tag-{i}') for i in range(2)]
+        cls.recipe = create_recipe(create_author(0), ingredients, tags)
+
+    def counts(self):
+        return (Recipe.objects.count(), RecipeIngredient.objects.count(),
+                Recipe.tags.through.objects.count(), Tag.objects.count(),
+                Ingredient.objects.count(), User.objects.count())
+
+    def test_reload_is_idempotent(self):
+        rows = [dump_recipe(self.recipe)]
+        before = self.counts()
+        for _ in range(2):
+            self.assertEqual(load_recipes(rows, 100), {
+                'recipes': 0, 'users': 0, 'tags': 0, 'ingredients': 0})
+            self.assertEqual(self.counts(), before)
+
+    def test_reload_replaces_relations(self):
+        row = dump_recipe(self.recipe)
+        row['tags'] = row['tags'][:1]
+        row['ingredients'][0]['amount'] = 7
+        load_recipes([row], 100)
+        self.assertEqual(list(self.recipe.tags.values_list(
+            'slug', flat=True)), [row['tags'][0]['slug']])
+        self.assertEqual(
+            sorted(self.recipe.recipe_ingredient.values_list(
+                'amount', flat=True)), [1, 1, 7])
+
+    def test_new_uid_creates_recipe(self):
+        row = dump_recipe(self.recipe)
+        row['uid'] = '00000000-0000-4000-8000-000000000001'
+        self.assertEqual(load_recipes([row], 100)['recipes'], 1)
+        self.assertEqual(Recipe.objects.count(), 2)
+        self.assertEqual(RecipeIngredient.objects.count(), 6)
+
+
+class UpsertTests(TestCase):
+    """Загрузка справочников добавляет и обновляет только отличающиеся
+    строки."""
+
+    def rows(self):
+        return [{'name': f'Тег {i}', 'color': '#FFFFFF', 'slug': f'tag-{i}'}
+                for i in range(5)]
+
+    def test_upsert(self):
+        self.assertEqual(upsert(Tag, ('slug',), self.rows()), (5, 0, 0))
+        self.assertEqual(upsert(Tag, ('slug',), self.rows()), (0, 0, 5))
+        rows = self.rows()
+        rows[2]['name'] = 'Новое название'
+        rows.append({'name': 'Тег 5', 'color': '#000000', 'slug': 'tag-5'})
+        self.assertEqual(upsert(Tag, ('slug',), rows), (1, 1, 4))
+        self.assertEqual(Tag.objects.get(slug='tag-2').name, 'Новое название')
+        self.assertEqual(Tag.objects.count(), 6)
+
+
+@task('tests.recalculate')
+def recalculate(edit_while_running=False):
+    if edit_while_running:
+        enqueue('tests.recalculate', idempotency_key='tests:1', repeat=True)
+    return {}
+
+
+@task('tests.fail')
+def fail():
+    raise ValueError('Сбой')
+
+
+class TaskQueueTests(TestCase):
+    """Очередь фоновых задач."""
+
+    def test_idempotency_key(self):
+        created = enqueue('tests.recalculate', idempotency_key='tests:1')
+        self.assertEqual(
+            enqueue('tests.recalculate', idempotency_key='tests:1').pk,
+            created.pk)
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_retry_then_fail(self):
+        created = enqueue('tests.fail', max_attempts=2)
+        with self.assertLogs('tasks.queue', 'ERROR'):
+            self.assertEqual(run_next().pk, created.pk)
+        created.refresh_from_db()
+        self.assertEqual(created.status, Task.PENDING)
+        self.assertEqual(created.attempts, 1)
+        self.assertGreater(created.run_after, timezone.now())
+        self.assertIsNone(run_next())
+        Task.objects.filter(pk=created.pk).update(run_after=timezone.now())
+        with self.assertLogs('tasks.queue', 'ERROR'):
+            self.assertEqual(run_next().pk, created.pk)
+        created.refresh_from_db()
+        self.assertEqual(created.status, Task.FAILED)
+        self.assertEqual(created.attempts, 2)
+        self.assertIsNone(run_next())
+        rearmed = enqueue('tests.fail', idempotency_key='tests:fail')
+        Task.objects.filter(pk=rearmed.pk).update(status=Task.FAILED)
+        rearmed = enqueue('tests.fail', idempotency_key='tests:fail')
+        self.assertEqual(rearmed.status, Task.PENDING)
+        self.assertEqual(rearmed.attempts, 0)
+
+    def stall(self, attempts):
+        created = enqueue('tests.recalculate')
+        Task.objects.filter(pk=created.pk).update(
+            status=Task.RUNNING, attempts=attempts,
+            started=timezone.now() - RUNNING_TIMEOUT * 2)
+        return created
+
+    def test_stale_running_reclaimed(self):
+        created = self.stall(1)
+        self.assertEqual(run_next().pk, created.pk)
+        created.refresh_from_db()
+        self.assertEqual(created.status, Task.DONE)
+        self.assertEqual(created.attempts, 2)
+
+    def test_stale_running_exhausted(self):
+        created = self.stall(3)
+        self.assertIsNone(run_next())
+        created.refresh_from_db()
+        self.assertEqual(created.status, Task.FAILED)
+        self.assertEqual(created.attempts, 3)
+
+    def test_repeat_while_running_runs_again(self):
+        created = enqueue('tests.recalculate', {'edit_while_running': True},
+                          idempotency_key='tests:1', repeat=True)
+        self.assertEqual(run_next().pk, created.pk)
+        created.refresh_from_db()
+        self.assertEqual(created.status, Task.PENDING)
+        self.assertEqual(created.attempts, 0)
+        self.assertFalse(created.rerun)
+        Task.objects.filter(pk=created.pk).update(kwargs='{}')
+        self.assertEqual(run_next().pk, created.pk)
+        created.refresh_from_db()
+        self.assertEqual(created.status, Task.DONE)
+        self.assertIsNone(run_next())
+
+
+class Base64ImageFieldTests(SimpleTestCase):
+    """Декодирование base64 частями совпадает с b64decode целиком."""
+
+    def test_wrapped_lines(self):
+        field = Base64ImageField()
+        field.chunk_size = 1000
+        raw = os.urandom(5001)
+        encoded = base64.b64encode(raw).decode()
+        for separator in ('\n', '\r\n'):
+            wrapped = separator.join(textwrap.wrap(encoded, 76))
+            with field.decode(wrapped) as file:
+                file.seek(0)
+                self.assertEqual(file.read(), raw)
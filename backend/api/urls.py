@@ -1,5 +1,6 @@
 from api.views.recipes import IngredientViewSet, RecipeViewSet, TagViewSet
 from api.views.base_api import BaseAPIRootView
+from api.views.metrics import MetricsView
 from api.views.users import UsersViewSet
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
@@ -21,4 +22,5 @@ router.register(r'tags', TagViewSet)
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
@@ -0,0 +1,15 @@
+from api.metrics import metrics
+from api.renderers import PlainTextRenderer
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+
+class MetricsView(APIView):
+    """Статистика запросов в текстовом формате Prometheus.
+    Доступна администраторам, в том числе по токену."""
+    permission_classes = (IsAdminUser,)
+    renderer_classes = (PlainTextRenderer,)
+
+    def get(self, request):
+        return Response(metrics.render())
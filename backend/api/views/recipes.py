@@ -1,23 +1,41 @@
+from api.autocomplete import ingredient_index
+from api.cookable import cookable_index
 from api.filters import IngredientFilter, RecipeFilter
+from api.mixins import CachedReferenceMixin
 from api.paginations import LimitPagination
 from api.permissions import IsAuthorOrReadOnly
-from api.serializers.recipes import (FavoriteSerializer, IngredientSerializer,
-                                     RecipeSerializer, ShoppingCartSerializer,
-                                     TagSerializer)
-from django.http import HttpResponse
+from api.renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
+from api.serializers.recipes import (CookableQuerySerializer,
+                                     CookableRecipeSerializer,
+                                     FavoriteSerializer,
+                                     IngredientQuerySerializer,
+                                     IngredientSerializer,
+                                     RecipeInfoSerializer, RecipeSerializer,
+                                     ShoppingCartSerializer,
+                                     SimilarQuerySerializer, TagSerializer)
+from api.serializers.tasks import ExportTaskSerializer
+from api.shopping_list import (EXPORTERS, export_storage, get_digest,
+                               get_shopping_list)
+from django.db import transaction
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
+from django.http import (FileResponse, Http404, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
-from reportlab.pdfbase import pdfmetrics, ttfonts
-from reportlab.pdfgen import canvas
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from tasks.models import Task
+from tasks.queue import enqueue
+from users.models import Follow, User
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedReferenceMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для обработки запросов на получение ингредиентов."""
+    cache_version_name = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
@@ -25,9 +43,23 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (AllowAny,)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        """Поиск по ?name= обслуживается индексом в памяти,
+        ?limit= ограничивает число подсказок."""
+        if 'name' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+        params = IngredientQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        ingredients = ingredient_index.search(
+            params.validated_data['name'],
+            params.validated_data.get('limit'))
+        serializer = self.get_serializer(ingredients, many=True)
+        return Response(serializer.data)
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(CachedReferenceMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для обработки запросов на получение тегов."""
+    cache_version_name = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
@@ -45,6 +77,40 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthorOrReadOnly,)
     pagination_class = LimitPagination
 
+    @property
+    def cursor_ordering(self):
+        if self.request.query_params.get('search'):
+            return ('-search_rank', '-id')
+        if self.action == 'trending':
+            return ('-trending_score', '-pub_date')
+        return ('-pub_date', '-id')
+
+    def get_queryset(self):
+        """Список и детали рецепта отдаются за фиксированное число запросов:
+        флаги пользователя считаются через Exists, связи предзагружаются."""
+        user = self.request.user
+        queryset = Recipe.objects.with_user_flags(user)
+        if self.action == 'trending':
+            queryset = queryset.order_by('-trending_score', '-pub_date')
+        if self.action in ('update', 'partial_update'):
+            return queryset.select_related('author')
+        if self.action not in ('list', 'retrieve', 'trending', 'cookable'):
+            return queryset
+        if user.is_anonymous:
+            is_subscribed = Value(False, output_field=BooleanField())
+        else:
+            is_subscribed = Exists(Follow.objects.filter(
+                user=user, author=OuterRef('pk')))
+        return queryset.prefetch_related(
+            Prefetch('author', queryset=User.objects.annotate(
+                is_subscribed=is_subscribed)),
+            'tags',
+            Prefetch('recipe_ingredient',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient'))
+        )
+
+    @transaction.atomic
     def action_post_delete(self, pk, serializer_class):
         user = self.request.user
         recipe = get_object_or_404(Recipe, pk=pk)
@@ -68,6 +134,51 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Этого рецепта нет в списке'},
                             status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False)
+    def trending(self, request):
+        """Рецепты по убыванию предрассчитанного рейтинга популярности
+        с теми же фильтрами, что и у списка."""
+        return self.list(request)
+
+    @action(detail=False)
+    def cookable(self, request):
+        """Рецепты по убыванию доли ингредиентов, которые есть у
+        пользователя: ?ingredients=1&ingredients=2; ?min_coverage=
+        от 0 до 1 отсекает рецепты с меньшим покрытием. Ранжирование
+        идет по индексу в памяти, из базы читается только страница."""
+        params = CookableQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        page = self.paginate_queryset(cookable_index.rank(
+            params.validated_data['ingredients'],
+            params.validated_data['min_coverage']))
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for _, _, recipe_id in page])
+        result = []
+        for coverage, _, recipe_id in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.coverage = round(coverage, 4)
+                result.append(recipe)
+        serializer = CookableRecipeSerializer(
+            result, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True)
+    def similar(self, request, pk):
+        """Похожие рецепты из предрассчитанной таблицы соседей одним
+        запросом по индексу; ?limit= от 1 до TOP_K ограничивает
+        их число."""
+        params = SimilarQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        recipes = Recipe.objects.filter(
+            similar_to__recipe_id=pk
+        ).order_by('-similar_to__score')[:params.validated_data['limit']]
+        if not recipes and not Recipe.objects.filter(pk=pk).exists():
+            raise Http404
+        serializer = RecipeInfoSerializer(
+            recipes, many=True, context={'request': request})
+        return Response(serializer.data)
+
     @action(methods=['POST', 'DELETE'], detail=True)
     def favorite(self, request, pk):
         return self.action_post_delete(pk, FavoriteSerializer)
@@ -76,35 +187,67 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def shopping_cart(self, request, pk):
         return self.action_post_delete(pk, ShoppingCartSerializer)
 
-    @action(detail=False)
+    @action(detail=False, permission_classes=(IsAuthenticated,),
+            renderer_classes=(PDFRenderer, PlainTextRenderer,
+                              CSVRenderer, JSONRenderer))
     def download_shopping_cart(self, request):
-        response = HttpResponse(content_type='application/pdf')
+        """Формат выбирается параметром ?format=pdf|txt|csv|json
+        или заголовком Accept; по умолчанию отдается PDF.
+        С ?async=1 выгрузка ставится в очередь и возвращается задача."""
+        renderer = request.accepted_renderer
+        items = get_shopping_list(request.user)
+        content_type = renderer.media_type + (
+            f'; charset={renderer.charset}' if renderer.charset else '')
+        if request.query_params.get('async'):
+            return self.enqueue_export(request, items, renderer.format,
+                                       content_type)
+        response = StreamingHttpResponse(
+            EXPORTERS[renderer.format](items), content_type=content_type)
+        response['Content-Disposition'] = (
+            f"attachment; filename='shopping_cart.{renderer.format}'"
+        )
+        return response
+
+    def enqueue_export(self, request, items, format, content_type):
+        user_id = request.user.id
+        task = enqueue(
+            'shopping_list.export',
+            {'user_id': user_id, 'format': format,
+             'content_type': content_type},
+            idempotency_key=(f'shopping_list:{user_id}:{format}:'
+                             f'{get_digest(items)}')
+        )
+        serializer = ExportTaskSerializer(task, context={'request': request})
+        return JsonResponse(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    def get_export_task(self, request, task_id):
+        task = get_object_or_404(
+            Task, pk=task_id, name='shopping_list.export')
+        if task.get_kwargs()['user_id'] != request.user.id:
+            raise Http404
+        return task
+
+    @action(detail=False, permission_classes=(IsAuthenticated,),
+            url_path=r'download_shopping_cart/(?P<task_id>\d+)')
+    def shopping_cart_export(self, request, task_id):
+        """Статус фоновой выгрузки списка покупок."""
+        task = self.get_export_task(request, task_id)
+        return Response(
+            ExportTaskSerializer(task, context={'request': request}).data)
+
+    @action(detail=False, permission_classes=(IsAuthenticated,),
+            url_path=r'download_shopping_cart/(?P<task_id>\d+)/file')
+    def shopping_cart_export_file(self, request, task_id):
+        """Готовый файл фоновой выгрузки списка покупок."""
+        task = self.get_export_task(request, task_id)
+        result = task.get_result()
+        if task.status != Task.DONE or not export_storage.exists(
+                result['file']):
+            raise Http404
+        response = FileResponse(export_storage.open(result['file']),
+                                content_type=result['content_type'])
         response['Content-Disposition'] = (
-            "attachment; filename='shopping_cart.pdf'"
+            "attachment; filename='shopping_cart."
+            f"{task.get_kwargs()['format']}'"
         )
-        p = canvas.Canvas(response)
-        arial = ttfonts.TTFont('Arial', 'data/arial.ttf')
-        pdfmetrics.registerFont(arial)
-        p.setFont('Arial', 14)
-
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_cart__user=request.user).values_list(
-            'ingredient__name', 'amount', 'ingredient__measurement_unit')
-
-        ingr_list = {}
-        for name, amount, unit in ingredients:
-            if name not in ingr_list:
-                ingr_list[name] = {'amount': amount, 'unit': unit}
-            else:
-                ingr_list[name]['amount'] += amount
-        height = 700
-
-        p.drawString(100, 750, 'Список покупок')
-        for i, (name, data) in enumerate(ingr_list.items(), start=1):
-            p.drawString(
-                80, height,
-                f"{i}. {name} – {data['amount']} {data['unit']}")
-            height -= 25
-        p.showPage()
-        p.save()
         return response
@@ -1,7 +1,10 @@
 from api.paginations import LimitPagination
 from api.serializers.users import FollowSerializer, UsersSerializer
+from django.db import transaction
+from django.db.models import BooleanField, Value
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
+from recipes.models import Recipe
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.permissions import (IsAuthenticated,
@@ -18,6 +21,7 @@ class UsersViewSet(UserViewSet):
     serializer_class = UsersSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = LimitPagination
+    cursor_ordering = ('id',)
     http_method_names = ['get', 'post', 'delete', 'head']
 
     def get_permissions(self):
@@ -27,6 +31,7 @@ class UsersViewSet(UserViewSet):
 
     @action(methods=['POST', 'DELETE'],
             detail=True, )
+    @transaction.atomic
     def subscribe(self, request, id):
         user = request.user
         author = get_object_or_404(User, id=id)
@@ -51,11 +56,30 @@ class UsersViewSet(UserViewSet):
             return Response({'error': 'Вы не подписаны на этого пользователя'},
                             status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def get_subscriptions(user):
+        return User.objects.filter(following__user=user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by('id')
+
+    @staticmethod
+    def attach_latest_recipes(authors, recipe_limit):
+        """Загружает рецепты всех авторов страницы одним запросом
+        и сохраняет их в атрибут latest_recipes каждого автора."""
+        recipes = Recipe.objects.filter(author__in=authors)
+        if recipe_limit:
+            recipes = recipes.limited_per_author(int(recipe_limit))
+        by_author = {author.id: [] for author in authors}
+        for recipe in recipes:
+            by_author[recipe.author_id].append(recipe)
+        for author in authors:
+            author.latest_recipes = by_author[author.id]
+
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        user = request.user
-        follows = User.objects.filter(following__user=user)
-        page = self.paginate_queryset(follows)
+        page = self.paginate_queryset(self.get_subscriptions(request.user))
+        self.attach_latest_recipes(
+            page, request.query_params.get('recipe_limit'))
         serializer = FollowSerializer(
             page, many=True,
             context={'request': request})
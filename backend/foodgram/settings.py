@@ -37,7 +37,8 @@ INSTALLED_APPS = [
 
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
-    'api.apps.ApiConfig'
+    'api.apps.ApiConfig',
+    'tasks.apps.TasksConfig'
 ]
 
 MIDDLEWARE = [
@@ -48,6 +49,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.InstrumentationMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -88,11 +90,38 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
     }
 }
 
 
+# Кеш default общий для всех процессов: воркеров gunicorn, фонового
+# воркера и management-команд. Через него расходятся версии справочников
+# и индексов в памяти. По умолчанию это таблица в основной БД
+# (manage.py createcachetable); memcached подключается переменными
+# CACHE_BACKEND и CACHE_LOCATION. Кеш local живет в памяти процесса:
+# в нем токены аутентификации и готовые ответы, чтобы их чтение не
+# стоило обращения к базе.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='django_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', default=10000)),
+        },
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'foodgram-local',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('LOCAL_CACHE_MAX_ENTRIES', default=10000)),
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -118,7 +147,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
@@ -152,6 +181,21 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static/')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
+# Файлы пользователей, которые nginx не раздает (выгрузки списка покупок):
+# отдаются только вьюхами после проверки владельца.
+
+PRIVATE_ROOT = os.getenv(
+    'PRIVATE_ROOT', default=os.path.join(BASE_DIR, 'private/'))
+
+# Фоновые задачи: число потоков для выполнения задач внутри процесса
+# приложения; 0 — задачи выполняет только manage.py run_worker.
+
+TASKS_LOCAL_THREADS = int(os.getenv('TASKS_LOCAL_THREADS', default=2))
+
+# Сколько часов хранить выполненные и упавшие задачи вместе с их файлами.
+
+TASKS_KEEP_HOURS = int(os.getenv('TASKS_KEEP_HOURS', default=24))
+
 # djoser settings
 
 DJOSER = {
@@ -167,3 +211,7 @@ DJOSER = {
         "current_user": "api.serializers.users.UsersSerializer",
     },
 }
+
+INSTRUMENTATION = os.getenv('INSTRUMENTATION', default='False') == 'True'
+INSTRUMENTATION_DUPLICATE_THRESHOLD = int(
+    os.getenv('INSTRUMENTATION_DUPLICATE_THRESHOLD', default=5))
@@ -0,0 +1,13 @@
+import os
+
+# Потоковые воркеры: запрос, ждущий БД или диск, не занимает процесс
+# целиком, и контейнер держит workers * threads соединений одновременно.
+# Замер manage.py benchmark (16 клиентов, 1 CPU) с задержкой 2 мс на
+# SQL-запрос: по сравнению с sync-воркерами пропускная способность выше
+# на 9-90%; без ожидания БД (запросы только к CPU) выигрыша нет.
+bind = os.getenv('GUNICORN_BIND', default='0:8000')
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', default=2))
+threads = int(os.getenv('GUNICORN_THREADS', default=8))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=60))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', default=5))
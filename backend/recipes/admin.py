@@ -48,8 +48,9 @@ class RecipeAdmin(ModelAdmin):
     display_tags.short_description = 'Теги'
 
     def favorite(self, obj):
-        return obj.favorite.count()
+        return obj.favorites_count
     favorite.short_description = 'Раз в избранном'
+    favorite.admin_order_field = 'favorites_count'
 
 
 @register(RecipeIngredient)
@@ -0,0 +1,52 @@
+"""Битовые маски множеств id в виде целых чисел Python: бит с номером id
+установлен, если id входит в множество. Операции над масками выполняются
+целиком в C и не создают объектов на каждый элемент."""
+
+
+def popcount(bitmap):
+    return bin(bitmap).count('1')
+
+
+def bitmap(positions, length):
+    """Битовая маска из номеров битов без пересоздания числа на каждый бит."""
+    buffer = bytearray(length // 8 + 1)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def highest_bits(bitmap, skip, count):
+    """Номера старших установленных битов: пропускает skip, отдает count."""
+    while bitmap and count:
+        position = bitmap.bit_length() - 1
+        bitmap ^= 1 << position
+        if skip:
+            skip -= 1
+        else:
+            yield position
+            count -= 1
+
+
+def count_planes(bitmaps):
+    """Побитовое сложение масок: бит в planes[i] — i-й разряд числа
+    масок, в которых этот бит установлен."""
+    planes = []
+    for carry in bitmaps:
+        for plane, value in enumerate(planes):
+            if not carry:
+                break
+            planes[plane], carry = value ^ carry, value & carry
+        if carry:
+            planes.append(carry)
+    return planes
+
+
+def exact_counts(planes):
+    """Пары (число, маска битов, встретившихся ровно столько раз)
+    по убыванию числа; пустые маски пропускаются."""
+    for count in range(2 ** len(planes) - 1, 0, -1):
+        mask = -1
+        for plane, value in enumerate(planes):
+            mask &= value if count >> plane & 1 else ~value
+        if mask:
+            yield count, mask
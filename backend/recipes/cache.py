@@ -0,0 +1,42 @@
+import time
+
+from django.core.cache import cache, caches
+
+VERSION_KEY = 'version:{}'
+VERSION_CHECK_INTERVAL = 5
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def get_shared_version(key):
+    return cache.get_or_set(key, now_ms, None)
+
+
+def get_version(name):
+    """Текущая версия набора данных — момент его последнего изменения
+    в миллисекундах; монотонно растет при каждом изменении. Хранится
+    в общем кеше (settings.CACHES), поэтому изменение в любом процессе
+    видно остальным. Вытесненная из кеша версия заводится заново
+    текущим временем, то есть считается изменением.
+
+    Процесс сверяется с общим кешем не чаще раза в
+    VERSION_CHECK_INTERVAL секунд, а между проверками берет версию из
+    кеша local: изменения из других процессов видны с этой задержкой,
+    свои — сразу."""
+    key = VERSION_KEY.format(name)
+    version = caches['local'].get(key)
+    if version is None:
+        version = get_shared_version(key)
+        caches['local'].set(key, version, VERSION_CHECK_INTERVAL)
+    return version
+
+
+def bump_version(name):
+    """Увеличивает версию набора данных, делая устаревшими его кеши."""
+    key = VERSION_KEY.format(name)
+    version = max(now_ms(), get_shared_version(key) + 1)
+    cache.set(key, version, None)
+    caches['local'].set(key, version, VERSION_CHECK_INTERVAL)
+    return version
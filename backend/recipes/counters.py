@@ -0,0 +1,31 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+# (модель со счетчиком, поле счетчика, считаемая модель, ссылка на модель)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def change_counter(model, field, pk, delta):
+    """Меняет счетчик через F(), не читая строку в Python."""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def recount(model, field, related_model, related_field):
+    """Пересчитывает счетчик для всех строк одним UPDATE."""
+    counts = related_model.objects.filter(
+        **{related_field: OuterRef('pk')}
+    ).order_by().values(related_field).annotate(
+        count=Count('pk')
+    ).values('count')
+    return model.objects.update(**{field: Coalesce(
+        Subquery(counts, output_field=IntegerField()), 0)})
@@ -0,0 +1,290 @@
+import csv
+import io
+import itertools
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+from recipes.cache import bump_version
+from recipes.counters import COUNTERS, recount
+from recipes.images import generate_renditions
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, SimilarRecipe, Tag)
+from recipes.trending import rebuild_scores
+from rest_framework.authtoken.models import Token
+from users.models import Follow, User
+
+PREFIX = 'fake'
+PASSWORD = 'fake-password'
+IMAGE = 'recipes/fake.png'
+IMAGE_SIZE = (640, 480)
+IMAGE_COLOR = (230, 200, 160)
+WORDS = ('суп', 'салат', 'пирог', 'каша', 'рагу', 'запеканка', 'соус',
+         'омлет', 'плов', 'блины', 'котлеты', 'паста')
+BATCH_SIZE = 500
+COPY_BATCH_SIZE = 100000
+MAX_SAMPLE_ROUNDS = 10
+
+
+def fake_users():
+    return User.objects.filter(username__startswith=f'{PREFIX}_')
+
+
+def delete_rows(queryset):
+    """Удаляет строки выборки одним DELETE ... WHERE id IN (SELECT ...),
+    без загрузки объектов, каскадов и сигналов."""
+    model = queryset.model
+    quote = connection.ops.quote_name
+    sql, params = queryset.values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {} WHERE {} IN ({})'.format(
+            quote(model._meta.db_table), quote(model._meta.pk.column), sql
+        ), params)
+        return cursor.rowcount
+
+
+def delete_fake_data():
+    """Удаляет синтетических пользователей и все их строки.
+    Таблицы чистятся в порядке зависимостей одним DELETE каждая, без
+    сигналов: число запросов не зависит от объема данных. Счетчики,
+    рейтинг и версию индексов затем один раз обновляет finish()."""
+    users = fake_users().values('id')
+    recipes = Recipe.objects.filter(author__in=users).values('id')
+    querysets = (
+        RecipeIngredient.objects.filter(recipe__in=recipes),
+        Recipe.tags.through.objects.filter(recipe__in=recipes),
+        SimilarRecipe.objects.filter(recipe__in=recipes),
+        SimilarRecipe.objects.filter(similar__in=recipes),
+        Favorite.objects.filter(user__in=users),
+        Favorite.objects.filter(recipe__in=recipes),
+        ShoppingCart.objects.filter(user__in=users),
+        ShoppingCart.objects.filter(recipe__in=recipes),
+        Follow.objects.filter(user__in=users),
+        Follow.objects.filter(author__in=users),
+        Token.objects.filter(user__in=users),
+        User.groups.through.objects.filter(user__in=users),
+        User.user_permissions.through.objects.filter(user__in=users),
+        Recipe.objects.filter(author__in=users),
+        fake_users(),
+    )
+    with transaction.atomic():
+        deleted = sum(delete_rows(queryset) for queryset in querysets)
+        if deleted:
+            finish()
+    return deleted
+
+
+def finish():
+    """Пересчитывает то, что при массовой записи не обновили сигналы.
+    Счетчики и рейтинг считаются агрегатными UPDATE в базе."""
+    for model, field, related_model, related_field in COUNTERS:
+        recount(model, field, related_model, related_field)
+    rebuild_scores()
+    # generate и delete_fake_data идут в транзакции: иначе другие
+    # процессы перестроили бы индексы до фиксации, по старым данным
+    transaction.on_commit(lambda: bump_version('recipe_ingredients'))
+
+
+def copy_available():
+    return connection.vendor == 'postgresql'
+
+
+def copy_rows(model, rows, batch_size=COPY_BATCH_SIZE):
+    """Пишет строки через COPY ... FROM STDIN (CSV) пачками;
+    незаданные поля заполняются значениями по умолчанию модели."""
+    fields = [field for field in model._meta.concrete_fields
+              if not field.primary_key]
+    now = timezone.now()
+    quote = connection.ops.quote_name
+    options = 'FORMAT csv'
+    nullable = [quote(field.column) for field in fields if field.null]
+    if nullable:
+        # csv.writer заключает None в кавычки, а пустая строка в кавычках
+        # для COPY не NULL
+        options += ', FORCE_NULL ({})'.format(', '.join(nullable))
+    sql = 'COPY {} ({}) FROM STDIN WITH ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(field.column) for field in fields), options)
+    count = 0
+    rows = iter(rows)
+    with connection.cursor() as cursor:
+        while True:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+            written = 0
+            for values in itertools.islice(rows, batch_size):
+                writer.writerow([
+                    field.get_db_prep_save(
+                        values[field.attname] if field.attname in values
+                        else now if getattr(field, 'auto_now', False)
+                        or getattr(field, 'auto_now_add', False)
+                        else field.get_default(), connection)
+                    for field in fields])
+                written += 1
+            if not written:
+                return count
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+            count += written
+
+
+def write_rows(model, rows, batch_size=BATCH_SIZE, use_copy=None):
+    """Записывает словари значений через COPY в PostgreSQL,
+    иначе через bulk_create. Возвращает число строк."""
+    if use_copy is None:
+        use_copy = copy_available()
+    if use_copy:
+        return copy_rows(model, rows)
+    count = 0
+    rows = iter(rows)
+    while True:
+        batch = [model(**values)
+                 for values in itertools.islice(rows, batch_size)]
+        if not batch:
+            return count
+        model.objects.bulk_create(batch)
+        count += len(batch)
+
+
+def zipf_weights(size, skew):
+    """Накопленные веса закона Ципфа: элемент ранга r весит 1 / r^skew."""
+    return list(itertools.accumulate(
+        1 / rank ** skew for rank in range(1, size + 1)))
+
+
+def degree(rng, mean, alpha):
+    """Степень с тяжелым хвостом (распределение Парето) и средним mean."""
+    if mean <= 0:
+        return 0
+    return int(mean * (alpha - 1) / alpha * rng.paretovariate(alpha))
+
+
+def weighted_sample(rng, population, cum_weights, count):
+    """До count различных элементов с вероятностью, пропорциональной весу.
+    Для очень популярных элементов повторы отбрасываются, поэтому
+    после нескольких попыток выборка может оказаться меньше."""
+    count = min(count, len(population))
+    chosen = set()
+    for _ in range(MAX_SAMPLE_ROUNDS):
+        if len(chosen) >= count:
+            break
+        chosen.update(rng.choices(
+            population, cum_weights=cum_weights, k=count - len(chosen)))
+    return sorted(chosen)
+
+
+def ensure_references(ingredients, tags, batch_size):
+    """Дополняет справочники синтетическими записями до нужного размера."""
+    missing = ingredients - Ingredient.objects.count()
+    if missing > 0:
+        Ingredient.objects.bulk_create((
+            Ingredient(name=f'{PREFIX} ингредиент {number}',
+                       measurement_unit='г')
+            for number in range(missing)
+        ), batch_size=batch_size, ignore_conflicts=True)
+    missing = tags - Tag.objects.count()
+    if missing > 0:
+        Tag.objects.bulk_create((
+            Tag(name=f'{PREFIX}{number}', color='#cccccc',
+                slug=f'{PREFIX}{number}')
+            for number in range(missing)
+        ), batch_size=batch_size, ignore_conflicts=True)
+    ingredient_ids = Ingredient.objects.order_by('id').values_list(
+        'id', flat=True)
+    tag_ids = Tag.objects.order_by('id').values_list('id', flat=True)
+    return list(ingredient_ids), list(tag_ids)
+
+
+def placeholder_image():
+    """Сохраняет общую картинку синтетических рецептов и ее уменьшенные
+    копии. Возвращает имя файла в хранилище поля image."""
+    buffer = io.BytesIO()
+    Image.new('RGB', IMAGE_SIZE, IMAGE_COLOR).save(buffer, 'PNG')
+    name = Recipe._meta.get_field('image').storage.save(
+        IMAGE, ContentFile(buffer.getvalue()))
+    generate_renditions(name)
+    return name
+
+
+def ranked(rng, ids, skew):
+    """Случайно назначает объектам ранги популярности."""
+    ids = list(ids)
+    rng.shuffle(ids)
+    return ids, zipf_weights(len(ids), skew)
+
+
+def generate(users=50, recipes=500, ingredients_per_recipe=8,
+             follows=10, favorites=20, carts=5, seed=0,
+             batch_size=BATCH_SIZE, alpha=2.0, skew=1.0, use_copy=None,
+             progress=None):
+    """Создает синтетический набор данных с реалистичной неравномерностью:
+    число рецептов у авторов и популярность авторов и рецептов следуют
+    закону Ципфа (skew), число подписок, избранного и покупок у
+    пользователей - распределению Парето со средним из параметров (alpha).
+    Один и тот же seed на той же базе дает один и тот же набор.
+    Возвращает число созданных строк по таблицам."""
+    rng = random.Random(seed)
+    written = {}
+
+    def write(model, rows):
+        written[model._meta.db_table] = write_rows(
+            model, rows, batch_size, use_copy)
+        if progress is not None:
+            progress(model, written[model._meta.db_table])
+
+    ingredient_ids, tag_ids = ensure_references(
+        max(ingredients_per_recipe * 4, 100), 3, batch_size)
+    image = placeholder_image()
+
+    password = make_password(PASSWORD)
+    write(User, (
+        {'username': f'{PREFIX}_{number}',
+         'email': f'{PREFIX}_{number}@example.com',
+         'first_name': 'Имя', 'last_name': 'Фамилия', 'password': password}
+        for number in range(users)))
+    user_ids = list(fake_users().order_by('id').values_list('id', flat=True))
+    authors, author_weights = ranked(rng, user_ids, skew)
+
+    write(Recipe, (
+        {'author_id': author_id,
+         'name': f'{rng.choice(WORDS).capitalize()} {number}',
+         'text': ' '.join(rng.choices(WORDS, k=20)),
+         'cooking_time': rng.randint(1, 180), 'image': image,
+         'renditions_ready': True}
+        for number, author_id in enumerate(rng.choices(
+            authors, cum_weights=author_weights, k=recipes))))
+    recipe_ids = list(Recipe.objects.filter(
+        author_id__in=user_ids).order_by('id').values_list('id', flat=True))
+    recipe_ids, recipe_weights = ranked(rng, recipe_ids, skew)
+
+    write(RecipeIngredient, (
+        {'recipe_id': recipe_id, 'ingredient_id': ingredient_id,
+         'amount': rng.randint(1, 500)}
+        for recipe_id in recipe_ids
+        for ingredient_id in rng.sample(
+            ingredient_ids, min(ingredients_per_recipe, len(ingredient_ids)))
+    ))
+    write(Recipe.tags.through, (
+        {'recipe_id': recipe_id, 'tag_id': tag_id}
+        for recipe_id in recipe_ids
+        for tag_id in rng.sample(tag_ids, rng.randint(1, len(tag_ids)))
+    ))
+    write(Follow, (
+        {'user_id': user_id, 'author_id': author_id}
+        for user_id in user_ids
+        for author_id in weighted_sample(
+            rng, authors, author_weights, degree(rng, follows, alpha))
+        if author_id != user_id
+    ))
+    for model, mean in ((Favorite, favorites), (ShoppingCart, carts)):
+        write(model, (
+            {'user_id': user_id, 'recipe_id': recipe_id}
+            for user_id in user_ids
+            for recipe_id in weighted_sample(
+                rng, recipe_ids, recipe_weights, degree(rng, mean, alpha))
+        ))
+    finish()
+    return written
@@ -0,0 +1,61 @@
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+from recipes.models import Recipe
+
+MAX_SIDE = 6000
+RENDITIONS = {
+    'small': (320, 320),
+    'medium': (960, 960),
+}
+FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+QUALITY = 80
+RENDITIONS_DIR = 'recipes/renditions'
+
+
+def check_dimensions(file):
+    """Читает только заголовок изображения, не декодируя пиксели."""
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+    file.seek(0)
+    return width <= MAX_SIDE and height <= MAX_SIDE
+
+
+def rendition_name(name, size, extension):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f'{RENDITIONS_DIR}/{stem}_{size}.{extension}'
+
+
+def rendition_names(name):
+    return {
+        size: {extension: rendition_name(name, size, extension)
+               for extension in FORMATS}
+        for size in RENDITIONS
+    }
+
+
+def generate_renditions(name, storage=default_storage):
+    """Создает уменьшенные копии изображения во всех форматах и отмечает
+    их готовность у рецептов с этим изображением. Уже существующие копии
+    пропускаются."""
+    with storage.open(name) as file, Image.open(file) as image:
+        image = image.convert('RGB')
+        for size, box in RENDITIONS.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail(box)
+            for extension, image_format in FORMATS.items():
+                target = rendition_name(name, size, extension)
+                if storage.exists(target):
+                    continue
+                buffer = io.BytesIO()
+                thumbnail.save(buffer, image_format, quality=QUALITY)
+                storage.save(target, ContentFile(buffer.getvalue()))
+    Recipe.objects.filter(image=name, renditions_ready=False).update(
+        renditions_ready=True)
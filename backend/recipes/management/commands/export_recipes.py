@@ -0,0 +1,37 @@
+import json
+import sys
+import time
+from contextlib import nullcontext
+
+from django.core.management import BaseCommand
+from recipes.transfer import dump_recipe, iter_recipes
+
+
+class Command(BaseCommand):
+    help = ('Выгружает рецепты с авторами, тегами и ингредиентами '
+            'в JSONL: одна строка на рецепт.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл выгрузки, "-" для stdout.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--with-images', action='store_true',
+                            help='Вложить изображения в base64.')
+
+    def handle(self, path, batch_size, with_images, **options):
+        report = self.stderr if path == '-' else self.stdout
+        output = (nullcontext(sys.stdout) if path == '-'
+                  else open(path, 'w', encoding='utf-8'))
+        started = time.monotonic()
+        count = 0
+        with output as file:
+            for recipe in iter_recipes(batch_size):
+                file.write(json.dumps(
+                    dump_recipe(recipe, with_images), ensure_ascii=False))
+                file.write('\n')
+                count += 1
+                if options['verbosity'] > 1 and count % batch_size == 0:
+                    report.write(f'{count} рецептов')
+        elapsed = time.monotonic() - started
+        report.write(self.style.SUCCESS(
+            f'=== Выгружено {count} рецептов за {elapsed:.1f} с '
+            f'({count / max(elapsed, 1e-6):.0f} строк/с) ==='))
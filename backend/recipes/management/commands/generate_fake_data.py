@@ -0,0 +1,69 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from recipes import fake_data
+
+
+class Command(BaseCommand):
+    help = ('Создает синтетических пользователей, рецепты, подписки, '
+            'избранное и списки покупок со степенным распределением '
+            'популярности для проверки под нагрузкой. В PostgreSQL строки '
+            'пишутся через COPY, в остальных СУБД - через bulk_create.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--follows-per-user', type=int, default=20,
+                            help='Среднее число подписок пользователя.')
+        parser.add_argument('--favorites-per-user', type=int, default=30)
+        parser.add_argument('--carts-per-user', type=int, default=5)
+        parser.add_argument('--alpha', type=float, default=2.0,
+                            help='Показатель хвоста Парето для числа '
+                                 'подписок и избранного (больше 1).')
+        parser.add_argument('--skew', type=float, default=1.0,
+                            help='Показатель закона Ципфа для '
+                                 'популярности авторов и рецептов.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int,
+                            default=fake_data.BATCH_SIZE)
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Не использовать COPY даже в PostgreSQL.')
+        parser.add_argument('--clear', action='store_true',
+                            help='Сначала удалить ранее созданные данные.')
+
+    def handle(self, *args, **options):
+        if options['alpha'] <= 1:
+            raise CommandError('--alpha должен быть больше 1')
+        if options['clear']:
+            deleted = fake_data.delete_fake_data()
+            self.stdout.write(self.style.SUCCESS(
+                f'=== Удалено строк: {deleted} ==='))
+        elif fake_data.fake_users().exists():
+            raise CommandError('Синтетические данные уже есть, '
+                               'запустите с --clear')
+        self.started = self.step = time.monotonic()
+        with transaction.atomic():
+            written = fake_data.generate(
+                users=options['users'], recipes=options['recipes'],
+                ingredients_per_recipe=options['ingredients_per_recipe'],
+                follows=options['follows_per_user'],
+                favorites=options['favorites_per_user'],
+                carts=options['carts_per_user'],
+                seed=options['seed'], batch_size=options['batch_size'],
+                alpha=options['alpha'], skew=options['skew'],
+                use_copy=False if options['no_copy'] else None,
+                progress=self.progress)
+        elapsed = time.monotonic() - self.started
+        total = sum(written.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'=== Создано {total} строк за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-6):.0f} строк/с) ==='))
+
+    def progress(self, model, count):
+        now = time.monotonic()
+        elapsed, self.step = now - self.step, now
+        self.stdout.write(
+            f'{model._meta.db_table}: {count} строк за {elapsed:.1f} с '
+            f'({count / max(elapsed, 1e-6):.0f} строк/с)')
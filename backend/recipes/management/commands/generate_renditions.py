@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+from recipes.images import generate_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создает уменьшенные копии изображений существующих рецептов.'
+
+    def handle(self, *args, **options):
+        names = Recipe.objects.exclude(image='').order_by().values_list(
+            'image', flat=True).distinct()
+        for name in names.iterator():
+            try:
+                generate_renditions(name)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'{name}: {error}')
+        self.stdout.write(self.style.SUCCESS('=== Копии созданы ==='))
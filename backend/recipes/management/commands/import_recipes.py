@@ -0,0 +1,100 @@
+import json
+import os
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from recipes.cache import bump_version
+from recipes.counters import COUNTERS, recount
+from recipes.transfer import load_recipes
+
+
+class Command(BaseCommand):
+    help = ('Загружает рецепты из JSONL, созданного export_recipes. '
+            'Рецепты сопоставляются по uid: найденные обновляются вместе '
+            'с тегами и ингредиентами, остальные создаются; авторы, теги '
+            'и ингредиенты - по естественным ключам. После каждой пачки '
+            'сохраняется контрольная точка, прерванная загрузка '
+            'продолжается с нее.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки, по умолчанию <path>.checkpoint.')
+        parser.add_argument('--restart', action='store_true',
+                            help='Начать сначала, игнорируя контрольную '
+                                 'точку.')
+
+    def handle(self, path, batch_size, **options):
+        self.batch_size = batch_size
+        self.verbosity = options['verbosity']
+        self.checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        offset = 0 if options['restart'] else self.read_checkpoint()
+        if offset:
+            self.stdout.write(f'Продолжение с позиции {offset}')
+        self.count = 0
+        self.created = {'recipes': 0, 'users': 0, 'tags': 0,
+                        'ingredients': 0}
+        started = time.monotonic()
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            rows = []
+            for line in file:
+                offset += len(line)
+                if not line.strip():
+                    continue
+                rows.append(json.loads(line))
+                if len(rows) == batch_size:
+                    self.load(rows, offset)
+                    rows = []
+            if rows:
+                self.load(rows, offset)
+        elapsed = time.monotonic() - started
+        self.finish()
+        self.stdout.write(self.style.SUCCESS(
+            f'=== Загружено {self.count} рецептов за {elapsed:.1f} с '
+            f'({self.count / max(elapsed, 1e-6):.0f} строк/с); '
+            f'новых рецептов {self.created["recipes"]}, '
+            f'авторов {self.created["users"]}, '
+            f'тегов {self.created["tags"]}, '
+            f'ингредиентов {self.created["ingredients"]} ==='))
+
+    def load(self, rows, offset):
+        try:
+            with transaction.atomic():
+                created = load_recipes(rows, self.batch_size)
+        except ValueError as error:
+            raise CommandError(error)
+        self.write_checkpoint(offset)
+        self.count += len(rows)
+        for name, value in created.items():
+            self.created[name] += value
+        if self.verbosity > 1:
+            self.stdout.write(f'{self.count} рецептов')
+
+    def finish(self):
+        """Пересчитывает то, что при bulk_create не обновили сигналы."""
+        with transaction.atomic():
+            for model, field, related_model, related_field in COUNTERS:
+                recount(model, field, related_model, related_field)
+        bump_version('recipe_ingredients')
+        if self.created['tags']:
+            bump_version('tags')
+        if self.created['ingredients']:
+            bump_version('ingredients')
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+    def read_checkpoint(self):
+        if not os.path.exists(self.checkpoint):
+            return 0
+        with open(self.checkpoint, encoding='utf-8') as file:
+            return int(file.read().strip() or 0)
+
+    def write_checkpoint(self, offset):
+        temporary = f'{self.checkpoint}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            file.write(str(offset))
+        os.replace(temporary, self.checkpoint)
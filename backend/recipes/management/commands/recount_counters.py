@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from recipes.counters import COUNTERS, recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики рецептов и авторов.'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            updated = recount(model, field, related_model, related_field)
+            self.stdout.write(self.style.SUCCESS(
+                f'=== {model.__name__}.{field}: {updated} строк ==='))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management import BaseCommand
+from recipes.similarity import BATCH_SIZE, TOP_K, rebuild_similar
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает для всех рецептов списки похожих рецептов '
+            '(косинусное сходство по ингредиентам и тегам).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=TOP_K,
+                            help='Число соседей у каждого рецепта.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = rebuild_similar(options['top_k'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'=== Сохранено {count} пар похожих рецептов '
+            f'за {time.monotonic() - started:.1f} с ==='))
@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+from recipes.trending import rebuild_scores
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рейтинг популярности рецептов.'
+
+    def handle(self, *args, **options):
+        updated = rebuild_scores()
+        self.stdout.write(self.style.SUCCESS(
+            f'=== Рейтинг пересчитан для {updated} рецептов ==='))
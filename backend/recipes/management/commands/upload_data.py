@@ -1,22 +1,107 @@
 import csv
+import hashlib
 from foodgram import settings
 from django.core.management import BaseCommand
-from recipes.models import Ingredient, Tag
+from django.db import transaction
+from recipes.cache import bump_version
+from recipes.models import DataSource, Ingredient, Tag
 
-MODELS_FILES = {
-    Ingredient: 'ingredients.csv',
-    Tag: 'tags.csv'
-}
+# (модель, файл, поля ключа, имя версии кеша)
+MODELS_FILES = (
+    (Ingredient, 'ingredients.csv', ('name', 'measurement_unit'),
+     'ingredients'),
+    (Tag, 'tags.csv', ('slug',), 'tags'),
+)
+CHUNK_SIZE = 64 * 1024
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def upsert(model, key_fields, rows):
+    """Сверяет пачку строк с базой одним запросом: добавляет новые,
+    обновляет отличающиеся. Возвращает (добавлено, обновлено, без изменений).
+    """
+    fields = tuple(rows[0])
+    value_fields = tuple(field for field in fields if field not in key_fields)
+    rows = {tuple(row[field] for field in key_fields): row for row in rows}
+    existing = {
+        tuple(getattr(item, field) for field in key_fields): item
+        for item in model.objects.filter(**{
+            f'{key_fields[0]}__in': {key[0] for key in rows}})
+    }
+    created, changed = [], []
+    for key, row in rows.items():
+        item = existing.get(key)
+        if item is None:
+            created.append(model(**row))
+            continue
+        if any(getattr(item, field) != row[field] for field in value_fields):
+            for field in value_fields:
+                setattr(item, field, row[field])
+            changed.append(item)
+    if created:
+        model.objects.bulk_create(created, ignore_conflicts=True)
+    if changed:
+        model.objects.bulk_update(changed, value_fields)
+    return len(created), len(changed), len(rows) - len(created) - len(changed)
 
 
 class Command(BaseCommand):
+    help = ('Загружает ингредиенты и теги из data/*.csv. Файлы, хеш '
+            'которых не изменился с прошлой загрузки, пропускаются, '
+            'из остальных добавляются и обновляются только отличающиеся '
+            'строки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--force', action='store_true',
+                            help='Сверить файлы, даже если хеш не менялся.')
+
     def handle(self, *args, **options):
-        for model, file in MODELS_FILES.items():
-            with open(f'{settings.BASE_DIR}/data/{file}',
-                      encoding='utf-8') as table:
-                reader = csv.DictReader(table)
-                model.objects.bulk_create(model(**data) for data in reader)
+        for model, file, key_fields, version in MODELS_FILES:
+            path = f'{settings.BASE_DIR}/data/{file}'
+            digest = file_digest(path)
+            if not options['force'] and DataSource.objects.filter(
+                    name=file, digest=digest).exists():
+                self.stdout.write(self.style.SUCCESS(
+                    f'=== {file} не изменился ==='))
+                continue
+            with transaction.atomic():
+                inserted, updated, unchanged = self.load(
+                    model, path, key_fields, options['batch_size'])
+                DataSource.objects.update_or_create(
+                    name=file, defaults={'digest': digest})
+            if inserted or updated:
+                bump_version(version)
             self.stdout.write(self.style.SUCCESS(
-                f'=== {file} успешно загружен ===')
+                f'=== {file}: добавлено {inserted}, обновлено {updated}, '
+                f'без изменений {unchanged} ===')
             )
         self.stdout.write(self.style.SUCCESS('=== Загрузка завершена ==='))
+
+    def load(self, model, path, key_fields, batch_size):
+        totals = [0, 0, 0]
+        with open(path, encoding='utf-8') as table:
+            reader = csv.DictReader(table)
+            for batch in batches(reader, batch_size):
+                for index, count in enumerate(
+                        upsert(model, key_fields, batch)):
+                    totals[index] += count
+        return totals
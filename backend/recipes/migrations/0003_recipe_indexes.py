@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:35
+
+from django.db import migrations, models
+
+
+def create_covering_index(apps, schema_editor):
+    # INCLUDE доступен только в PostgreSQL 11+; Django 2.2 его не описывает.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipe_ingredient_cover_idx '
+        'ON recipes_recipeingredient (recipe_id) '
+        'INCLUDE (ingredient_id, amount)'
+    )
+
+
+def drop_covering_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS recipe_ingredient_cover_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_auto_20230411_1410'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date'], name='recipe_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.RunPython(create_covering_index, drop_covering_index),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:37
+
+from datetime import datetime, timedelta, timezone
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+HALF_LIFE = timedelta(days=7)
+
+
+def fill_scores(apps, schema_editor):
+    # Все существующие события получают дату миграции.
+    factor = 2 ** ((django.utils.timezone.now() - EPOCH) / HALF_LIFE)
+    apps.get_model('recipes', 'Recipe').objects.update(trending_score=(
+        F('favorites_count') * 2.0 + F('in_carts_count')) * factor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorite',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending_score', '-pub_date'], name='recipe_trending_idx'),
+        ),
+        migrations.RunPython(fill_scores, migrations.RunPython.noop),
+    ]
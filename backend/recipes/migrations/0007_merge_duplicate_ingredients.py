@@ -0,0 +1,46 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:50
+
+from django.db import migrations
+from django.db.models import Count, F, Min, OuterRef, Subquery
+
+
+def merge_duplicates(apps, schema_editor):
+    """Оставляет у повторяющихся ингредиентов самую раннюю запись
+    и переносит на нее ссылки из рецептов."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    groups = Ingredient.objects.values('name', 'measurement_unit').annotate(
+        keep=Min('id'), count=Count('id')).filter(count__gt=1)
+    for group in groups:
+        duplicates = Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=group['keep']).values_list('id', flat=True)
+        for duplicate in duplicates:
+            # В рецепте с обоими ингредиентами количества складываются.
+            RecipeIngredient.objects.filter(
+                ingredient_id=group['keep'],
+                recipe__in=RecipeIngredient.objects.filter(
+                    ingredient_id=duplicate).values('recipe')
+            ).update(amount=F('amount') + Subquery(
+                RecipeIngredient.objects.filter(
+                    ingredient_id=duplicate, recipe=OuterRef('recipe')
+                ).values('amount')[:1]))
+            RecipeIngredient.objects.filter(
+                ingredient_id=duplicate,
+                recipe__in=RecipeIngredient.objects.filter(
+                    ingredient_id=group['keep']).values('recipe')
+            ).delete()
+            RecipeIngredient.objects.filter(
+                ingredient_id=duplicate).update(ingredient_id=group['keep'])
+        Ingredient.objects.filter(id__in=list(duplicates)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
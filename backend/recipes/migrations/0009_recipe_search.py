@@ -0,0 +1,69 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:20
+
+import django.contrib.postgres.search
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+CONFIG = 'russian'
+INDEX = 'recipe_search_idx'
+
+# Триггер пересчитывает вектор при любой записи названия или описания,
+# включая bulk_create, bulk_update и COPY.
+CREATE_TRIGGER = (
+    'CREATE FUNCTION recipes_recipe_search_vector() RETURNS trigger AS $$ '
+    'BEGIN NEW.search_vector := '
+    "setweight(to_tsvector('{0}', coalesce(NEW.name, '')), 'A') || "
+    "setweight(to_tsvector('{0}', coalesce(NEW.text, '')), 'B'); "
+    'RETURN NEW; END $$ LANGUAGE plpgsql'.format(CONFIG),
+    'CREATE TRIGGER recipes_recipe_search_vector '
+    'BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe '
+    'FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_vector()',
+)
+DROP_TRIGGER = (
+    'DROP TRIGGER recipes_recipe_search_vector ON recipes_recipe',
+    'DROP FUNCTION recipes_recipe_search_vector()',
+)
+
+
+# Индекс и триггер есть только в PostgreSQL: в SQLite GIN-индексов нет,
+# там поиск идет по FTS5-таблице, которую создает recipes.search.
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Recipe = apps.get_model('recipes', 'Recipe')
+    for sql in CREATE_TRIGGER:
+        schema_editor.execute(sql)
+    Recipe.objects.using(schema_editor.connection.alias).update(
+        search_vector=SearchVector('name', weight='A', config=CONFIG)
+        + SearchVector('text', weight='B', config=CONFIG))
+    schema_editor.add_index(
+        Recipe, GinIndex(fields=['search_vector'], name=INDEX))
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Recipe = apps.get_model('recipes', 'Recipe')
+    schema_editor.remove_index(
+        Recipe, GinIndex(fields=['search_vector'], name=INDEX))
+    for sql in DROP_TRIGGER:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_ingredient_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True,
+                verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
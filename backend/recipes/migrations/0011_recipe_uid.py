@@ -0,0 +1,44 @@
+# Generated by Django 2.2.16 on 2026-10-18 22:05
+
+import itertools
+import uuid
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fill_uids(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    ids = Recipe.objects.order_by('pk').values_list('pk', flat=True)
+    ids = iter(ids.iterator())
+    while True:
+        batch = [Recipe(pk=pk, uid=uuid.uuid4())
+                 for pk in itertools.islice(ids, BATCH_SIZE)]
+        if not batch:
+            return
+        Recipe.objects.bulk_update(batch, ('uid',))
+
+
+class Migration(migrations.Migration):
+    # Заполнение и ограничение уникальности в одной транзакции PostgreSQL
+    # не дает выполнить: ALTER TABLE падает из-за отложенных триггеров.
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0010_similar_recipe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='uid',
+            field=models.UUIDField(editable=False, null=True, verbose_name='Идентификатор для переноса между базами'),
+        ),
+        migrations.RunPython(fill_uids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='recipe',
+            name='uid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Идентификатор для переноса между базами'),
+        ),
+    ]
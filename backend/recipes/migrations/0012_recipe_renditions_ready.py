@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 22:08
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+from recipes.images import rendition_names
+
+
+def mark_ready(apps, schema_editor):
+    """Отмечает рецепты, копии изображений которых уже созданы."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    names = Recipe.objects.exclude(image='').order_by().values_list(
+        'image', flat=True).distinct()
+    for name in list(names):
+        if all(default_storage.exists(rendition)
+               for renditions in rendition_names(name).values()
+               for rendition in renditions.values()):
+            Recipe.objects.filter(image=name).update(renditions_ready=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_uid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='renditions_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Уменьшенные копии готовы'),
+        ),
+        migrations.RunPython(mark_ready, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,12 @@
+import uuid
+
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import (BooleanField, Exists, OuterRef, Subquery,
+                              UniqueConstraint, Value)
+from recipes.storage import ContentHashStorage
 
 User = get_user_model()
 
@@ -19,6 +24,12 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = (
+            UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique ingredient'
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
@@ -48,6 +59,31 @@ class Tag(models.Model):
         return f'{self.name}'
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Кверисет рецептов с аннотациями для текущего пользователя."""
+
+    def with_user_flags(self, user):
+        """Аннотирует рецепты флагами is_favorited и is_in_shopping_cart."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField())
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')))
+        )
+
+    def limited_per_author(self, limit):
+        """Оставляет не более limit последних рецептов каждого автора
+        одним запросом с коррелированным подзапросом."""
+        latest = Recipe.objects.filter(
+            author=OuterRef('author')).values('pk')[:limit]
+        return self.filter(pk__in=Subquery(latest))
+
+
 class Recipe(models.Model):
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -57,7 +93,8 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         verbose_name='Картинка',
-        upload_to='recipes/'
+        upload_to='recipes/',
+        storage=ContentHashStorage()
     )
     name = models.CharField(
         verbose_name='Название',
@@ -88,11 +125,53 @@ class Recipe(models.Model):
         auto_now=True,
         verbose_name='Дата публикации'
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Раз в избранном',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='Раз в списке покупок',
+        default=0,
+        editable=False
+    )
+    trending_score = models.FloatField(
+        verbose_name='Популярность',
+        default=0,
+        editable=False
+    )
+    uid = models.UUIDField(
+        verbose_name='Идентификатор для переноса между базами',
+        default=uuid.uuid4,
+        unique=True,
+        editable=False
+    )
+    renditions_ready = models.BooleanField(
+        verbose_name='Уменьшенные копии готовы',
+        default=False,
+        editable=False
+    )
+    # Заполняется триггером PostgreSQL из миграции 0009; в SQLite
+    # не используется, поиск идет по FTS5-таблице (recipes.search).
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(fields=('-pub_date',), name='recipe_pub_date_idx'),
+            models.Index(fields=('author', '-pub_date'),
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=('-trending_score', '-pub_date'),
+                         name='recipe_trending_idx'),
+        )
 
     def __str__(self):
         return f'{self.name[:50]}'
@@ -146,6 +225,10 @@ class Favorite(models.Model):
         verbose_name='Рецепты',
         related_name='favorite'
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True
+    )
 
     class Meta:
         verbose_name = 'Избранный рецепт'
@@ -174,6 +257,10 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепты',
         related_name='shopping_cart'
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True
+    )
 
     class Meta:
         verbose_name = 'Рецепт в корзине'
@@ -187,3 +274,61 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.recipe} в корзине у {self.user}'
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='neighbours'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Похожий рецепт',
+        related_name='similar_to'
+    )
+    score = models.FloatField(
+        verbose_name='Сходство'
+    )
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = (
+            UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique similar recipe'
+            ),
+        )
+        indexes = (
+            models.Index(fields=('recipe', '-score'),
+                         name='similar_recipe_score_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.similar} похож на {self.recipe}'
+
+
+class DataSource(models.Model):
+    name = models.CharField(
+        verbose_name='Файл',
+        max_length=100,
+        unique=True
+    )
+    digest = models.CharField(
+        verbose_name='SHA-256 содержимого',
+        max_length=64
+    )
+    loaded = models.DateTimeField(
+        verbose_name='Дата загрузки',
+        auto_now=True
+    )
+
+    class Meta:
+        verbose_name = 'Загруженный файл данных'
+        verbose_name_plural = 'Загруженные файлы данных'
+
+    def __str__(self):
+        return self.name
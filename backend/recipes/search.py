@@ -0,0 +1,106 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+# В PostgreSQL поиск идет по полю Recipe.search_vector с GIN-индексом,
+# которое ведет триггер из миграции 0009. Для SQLite, где разрабатывают
+# локально, есть отдельный запасной путь на сыром SQL: внешняя
+# FTS5-таблица над recipes_recipe, где релевантность дает столбец rank
+# (bm25 с весом названия 10 к 1).
+CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+FTS_TRIGGERS = {
+    'recipes_recipe_fts_insert': (
+        'AFTER INSERT ON recipes_recipe BEGIN '
+        'INSERT INTO recipes_recipe_fts(rowid, name, text) '
+        'VALUES (new.id, new.name, new.text); END'),
+    'recipes_recipe_fts_delete': (
+        'AFTER DELETE ON recipes_recipe BEGIN '
+        'INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, '
+        "text) VALUES ('delete', old.id, old.name, old.text); END"),
+    'recipes_recipe_fts_update': (
+        'AFTER UPDATE OF name, text ON recipes_recipe BEGIN '
+        'INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, '
+        "text) VALUES ('delete', old.id, old.name, old.text); "
+        'INSERT INTO recipes_recipe_fts(rowid, name, text) '
+        'VALUES (new.id, new.name, new.text); END'),
+}
+ENDING = re.compile(
+    r'(ами|ями|ого|его|ому|ему|ыми|ими|ой|ей|ом|ем|ам|ям|ах|ях|ов|ев|ых|их'
+    r'|ую|юю|ая|яя|ое|ее|ые|ие|[аеёиоуыэюяйь])$')
+MIN_STEM = 3
+WORD = re.compile(r'\w+')
+
+
+def stem(word):
+    """Грубое отсечение окончания для FTS5, где нет русского стеммера:
+    «борща» и «борщами» ищутся префиксом «борщ*»."""
+    stripped = ENDING.sub('', word)
+    return stripped if len(stripped) >= MIN_STEM else word
+
+
+def create_sqlite_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Создает FTS5-таблицу и ее триггеры, если их нет, и заполняет
+    индекс. Вызывается после каждого migrate: SQLite теряет триггеры,
+    когда миграция пересоздает таблицу recipes_recipe."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+        if 'recipes_recipe' not in tables:
+            return
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        missing = set(FTS_TRIGGERS) - {name for name, in cursor.fetchall()}
+        if FTS_TABLE in tables and not missing:
+            return
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            "name, text, content='recipes_recipe', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')")
+        for name in missing:
+            cursor.execute(f'CREATE TRIGGER {name} {FTS_TRIGGERS[name]}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) '
+            "VALUES ('rank', 'bm25(10.0, 1.0)')")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def search_postgresql(queryset, text):
+    query = SearchQuery(text, config=CONFIG)
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=SearchRank(F('search_vector'), query))
+
+
+def search_sqlite(queryset, text):
+    words = WORD.findall(text.lower())
+    table = queryset.model._meta.db_table
+    match = ' '.join(f'"{stem(word)}"*' for word in words)
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+        params=[match]
+    ).annotate(search_rank=RawSQL(
+        f'-{FTS_TABLE}.rank', (), output_field=FloatField()))
+
+
+def search_recipes(queryset, text):
+    """Оставляет рецепты, подходящие под запрос по названию и описанию,
+    и упорядочивает их по релевантности search_rank."""
+    if not WORD.search(text):
+        return queryset.none()
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        queryset = search_postgresql(queryset, text)
+    elif vendor == 'sqlite':
+        queryset = search_sqlite(queryset, text)
+    else:
+        queryset = queryset.filter(
+            Q(name__icontains=text) | Q(text__icontains=text)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+    return queryset.order_by('-search_rank', '-pub_date', '-id')
@@ -0,0 +1,70 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipes.cache import bump_version
+from recipes.counters import COUNTERS, change_counter
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.trending import change_score, event_score
+from tasks.models import Task
+from tasks.queue import enqueue
+
+
+# Версия меняется после фиксации: иначе параллельный запрос успел бы
+# закешировать под новой версией еще не зафиксированные данные.
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(**kwargs):
+    transaction.on_commit(lambda: bump_version('ingredients'))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(**kwargs):
+    transaction.on_commit(lambda: bump_version('tags'))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, **kwargs):
+    if instance.image and not instance.renditions_ready:
+        name = instance.image.name
+        task = enqueue('recipes.renditions', {'name': name},
+                       idempotency_key=f'renditions:{name}')
+        # Тот же файл уже загружали: копии есть, задача не повторится
+        if task.status == Task.DONE:
+            Recipe.objects.filter(pk=instance.pk).update(
+                renditions_ready=True)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def trending_event_created(sender, instance, created, **kwargs):
+    if created:
+        change_score(instance.recipe_id,
+                     event_score(sender, instance.created))
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def trending_event_deleted(sender, instance, **kwargs):
+    change_score(instance.recipe_id, -event_score(sender, instance.created))
+
+
+def counter_receivers(model, field, related_field):
+    """Обработчики, поддерживающие счетчик при создании/удалении строк.
+    Выполняются в транзакции записи, которая их вызвала."""
+    def created(instance, created, **kwargs):
+        if created:
+            change_counter(
+                model, field, getattr(instance, f'{related_field}_id'), 1)
+
+    def deleted(instance, **kwargs):
+        change_counter(
+            model, field, getattr(instance, f'{related_field}_id'), -1)
+
+    return created, deleted
+
+
+for model, field, sender, related_field in COUNTERS:
+    created, deleted = counter_receivers(model, field, related_field)
+    post_save.connect(created, sender=sender, weak=False,
+                      dispatch_uid=f'{field}_created')
+    post_delete.connect(deleted, sender=sender, weak=False,
+                        dispatch_uid=f'{field}_deleted')
@@ -0,0 +1,196 @@
+import heapq
+import itertools
+import math
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Q
+from recipes.bitmaps import bitmap, count_planes, exact_counts, highest_bits
+from recipes.models import Recipe, RecipeIngredient, SimilarRecipe
+
+# Рецепт - разреженный двоичный вектор признаков: id ингредиентов и
+# отрицательные id тегов. Признаки взвешиваются по IDF, сходство -
+# косинус. Кандидаты в соседи - CANDIDATES рецептов с наибольшим числом
+# общих ингредиентов (при равенстве - более новые), для них считается
+# точный косинус с учетом тегов.
+TOP_K = 10
+CANDIDATES = 200
+BATCH_SIZE = 1000
+
+
+def load_features(recipe_ids=None):
+    """Признаки рецептов: {id рецепта: множество признаков}."""
+    ingredients = RecipeIngredient.objects.order_by().values_list(
+        'recipe_id', 'ingredient_id')
+    tags = Recipe.tags.through.objects.order_by().values_list(
+        'recipe_id', 'tag_id')
+    if recipe_ids is not None:
+        ingredients = ingredients.filter(recipe_id__in=recipe_ids)
+        tags = tags.filter(recipe_id__in=recipe_ids)
+    features = {}
+    for recipe_id, ingredient_id in ingredients.iterator():
+        features.setdefault(recipe_id, set()).add(ingredient_id)
+    for recipe_id, tag_id in tags.iterator():
+        features.setdefault(recipe_id, set()).add(-tag_id)
+    return features
+
+
+def load_frequencies(features):
+    """Число рецептов с каждым из признаков, двумя запросами."""
+    ingredients = RecipeIngredient.objects.filter(
+        ingredient_id__in=[feature for feature in features if feature > 0]
+    ).order_by().values('ingredient_id').annotate(count=Count('id'))
+    tags = Recipe.tags.through.objects.filter(
+        tag_id__in=[-feature for feature in features if feature < 0]
+    ).order_by().values('tag_id').annotate(count=Count('id'))
+    frequencies = {row['ingredient_id']: row['count'] for row in ingredients}
+    frequencies.update((-row['tag_id'], row['count']) for row in tags)
+    return frequencies
+
+
+class Space:
+    """Квадраты IDF-весов признаков и нормы векторов рецептов."""
+    def __init__(self, frequencies, total):
+        self.frequencies = frequencies
+        self.weights = {feature: math.log(1 + total / count) ** 2
+                        for feature, count in frequencies.items()}
+        self.norms = {}
+
+    def norm(self, recipe_id, features):
+        norm = self.norms.get(recipe_id)
+        if norm is None:
+            norm = self.norms[recipe_id] = math.sqrt(
+                sum(self.weights[feature] for feature in features))
+        return norm
+
+    def nearest(self, recipe_id, features, candidates, top_k):
+        """Кортежи (сходство, id) для top_k ближайших кандидатов."""
+        norm = self.norm(recipe_id, features)
+        return heapq.nlargest(top_k, (
+            (sum(self.weights[feature] for feature in features & other)
+             / (norm * self.norm(candidate_id, other)), candidate_id)
+            for candidate_id, other in candidates
+        ))
+
+
+def ingredient_postings(features, positions):
+    """Битовые маски рецептов каждого ингредиента по позициям рецептов."""
+    postings = {}
+    for recipe_id, recipe_features in features.items():
+        for feature in recipe_features:
+            if feature > 0:
+                postings.setdefault(feature, []).append(positions[recipe_id])
+    return {feature: bitmap(recipe_positions, len(positions))
+            for feature, recipe_positions in postings.items()}
+
+
+def find_candidates(position, features, postings):
+    """Побитовым сложением масок ингредиентов рецепта находит позиции
+    рецептов с наибольшим числом общих ингредиентов."""
+    planes = count_planes(
+        postings[feature] for feature in features if feature > 0)
+    candidates = []
+    for _, mask in exact_counts(planes):
+        candidates.extend(highest_bits(
+            mask & ~(1 << position), 0, CANDIDATES - len(candidates)))
+        if len(candidates) >= CANDIDATES:
+            break
+    return candidates
+
+
+def neighbour_rows(features, space, top_k):
+    # Позиции по возрастанию id: старшие биты - более новые рецепты.
+    recipe_ids = sorted(features)
+    positions = {recipe_id: position
+                 for position, recipe_id in enumerate(recipe_ids)}
+    postings = ingredient_postings(features, positions)
+    for position, recipe_id in enumerate(recipe_ids):
+        recipe_features = features[recipe_id]
+        candidates = (
+            (recipe_ids[candidate], features[recipe_ids[candidate]])
+            for candidate in find_candidates(
+                position, recipe_features, postings))
+        for score, similar_id in space.nearest(
+                recipe_id, recipe_features, candidates, top_k):
+            yield SimilarRecipe(
+                recipe_id=recipe_id, similar_id=similar_id, score=score)
+
+
+@transaction.atomic
+def rebuild_similar(top_k=TOP_K, batch_size=BATCH_SIZE):
+    """Пересчитывает соседей всех рецептов. Возвращает число строк."""
+    features = load_features()
+    frequencies = Counter(
+        feature for recipe_features in features.values()
+        for feature in recipe_features)
+    space = Space(frequencies, len(features))
+    SimilarRecipe.objects.all().delete()
+    rows = neighbour_rows(features, space, top_k)
+    count = 0
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return count
+        SimilarRecipe.objects.bulk_create(batch)
+        count += len(batch)
+
+
+def query_candidates(recipe_id, features):
+    """То же, что find_candidates, одним запросом с группировкой."""
+    return list(RecipeIngredient.objects.filter(
+        ingredient_id__in=[feature for feature in features if feature > 0]
+    ).exclude(recipe_id=recipe_id).order_by().values('recipe_id').annotate(
+        shared=Count('id')
+    ).order_by('-shared', '-recipe_id').values_list(
+        'recipe_id', flat=True)[:CANDIDATES])
+
+
+def score_candidates(recipe_id, features):
+    """Кортежи (сходство, id) для всех кандидатов по убыванию сходства."""
+    frequencies = load_frequencies(features)
+    candidates = load_features(query_candidates(recipe_id, features))
+    frequencies.update(load_frequencies(
+        set().union(*candidates.values()) - set(frequencies)))
+    space = Space(frequencies, Recipe.objects.count())
+    return space.nearest(
+        recipe_id, features, candidates.items(), len(candidates))
+
+
+def reverse_changes(recipe_id, scored, top_k):
+    """Строки, добавляющие рецепт в списки соседей кандидатов, у которых
+    он ближе текущего top_k-го соседа, и id вытесненных им строк."""
+    rows = {}
+    for row_id, owner_id, score in SimilarRecipe.objects.filter(
+            recipe_id__in=[candidate_id for _, candidate_id in scored]
+    ).exclude(similar_id=recipe_id).values_list('id', 'recipe_id', 'score'):
+        rows.setdefault(owner_id, []).append((score, row_id))
+    created, evicted = [], []
+    for score, owner_id in scored:
+        current = sorted(rows.get(owner_id, ()), reverse=True)
+        if len(current) >= top_k and score <= current[top_k - 1][0]:
+            continue
+        created.append(SimilarRecipe(
+            recipe_id=owner_id, similar_id=recipe_id, score=score))
+        evicted.extend(row_id for _, row_id in current[top_k - 1:])
+    return created, evicted
+
+
+def refresh_similar(recipe_id, top_k=TOP_K):
+    """Пересчитывает соседей одного рецепта после изменения его
+    ингредиентов или тегов и добавляет его в списки рецептов, для которых
+    он стал одним из top_k ближайших. Рецепты, у которых он выпал из
+    соседей, получат замену при следующем rebuild_similar.
+    Все чтения выполняются до короткой транзакции записи."""
+    features = load_features([recipe_id]).get(recipe_id)
+    scored = score_candidates(recipe_id, features) if features else []
+    created, evicted = reverse_changes(recipe_id, scored, top_k)
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(
+            Q(recipe_id=recipe_id) | Q(similar_id=recipe_id)
+            | Q(id__in=evicted)).delete()
+        SimilarRecipe.objects.bulk_create([
+            SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                          score=score)
+            for score, similar_id in scored[:top_k]
+        ] + created)
+    return len(scored[:top_k])
@@ -0,0 +1,31 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+
+
+def content_digest(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in iter(lambda: content.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+    """Хранилище, именующее файлы хешем содержимого.
+    Одинаковые загрузки сохраняются один раз и делят общий файл."""
+
+    def save(self, name, content, max_length=None):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = content_digest(content)
+        name = os.path.join(directory, digest[:2], digest + extension)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
@@ -0,0 +1,14 @@
+from recipes.images import generate_renditions
+from recipes.similarity import refresh_similar
+from tasks.queue import task
+
+
+@task('recipes.renditions')
+def renditions(name):
+    generate_renditions(name)
+    return {'name': name}
+
+
+@task('recipes.similar')
+def similar(recipe_id):
+    return {'recipe_id': recipe_id, 'neighbours': refresh_similar(recipe_id)}
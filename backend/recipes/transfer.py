@@ -0,0 +1,189 @@
+import base64
+import os
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.utils.dateparse import parse_datetime
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+USER_FIELDS = ('username', 'email', 'first_name', 'last_name')
+TAG_FIELDS = ('name', 'color', 'slug')
+RECIPE_FIELDS = ('name', 'text', 'cooking_time', 'image', 'author',
+                 'pub_date')
+
+
+def iter_recipes(batch_size):
+    """Рецепты по возрастанию id пачками по batch_size:
+    в памяти одновременно только одна пачка со связями."""
+    last_id = 0
+    while True:
+        batch = list(Recipe.objects.filter(pk__gt=last_id).order_by(
+            'pk'
+        ).select_related('author').prefetch_related(
+            'tags', 'recipe_ingredient__ingredient'
+        )[:batch_size])
+        if not batch:
+            return
+        yield from batch
+        last_id = batch[-1].pk
+
+
+def read_image(name):
+    """Содержимое изображения в base64 или None, если файла нет."""
+    storage = Recipe._meta.get_field('image').storage
+    if not storage.exists(name):
+        return None
+    with storage.open(name) as file:
+        return base64.b64encode(file.read()).decode('ascii')
+
+
+def dump_recipe(recipe, with_images=False):
+    """Рецепт по uid со связями по естественным ключам: автор по email,
+    теги по slug, ингредиенты по названию и единице измерения."""
+    row = {
+        'uid': str(recipe.uid),
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'pub_date': recipe.pub_date.isoformat(),
+        'image': recipe.image.name,
+        'author': {field: getattr(recipe.author, field)
+                   for field in USER_FIELDS},
+        'tags': [{field: getattr(tag, field) for field in TAG_FIELDS}
+                 for tag in recipe.tags.all()],
+        'ingredients': [{
+            'name': item.ingredient.name,
+            'measurement_unit': item.ingredient.measurement_unit,
+            'amount': item.amount,
+        } for item in recipe.recipe_ingredient.all()],
+    }
+    if with_images and recipe.image:
+        image_data = read_image(recipe.image.name)
+        if image_data is not None:
+            row['image_data'] = image_data
+    return row
+
+
+class NaturalKey:
+    """Сопоставление строк выгрузки с объектами по естественному ключу."""
+    def __init__(self, model, fields, build):
+        self.model = model
+        self.fields = fields
+        self.build = build
+
+    def key(self, row):
+        return tuple(row[field] for field in self.fields)
+
+    def fetch(self, keys):
+        values = self.model.objects.filter(**{
+            f'{self.fields[0]}__in': {key[0] for key in keys}
+        }).values_list('pk', *self.fields)
+        return {tuple(key): pk for pk, *key in values}
+
+    def resolve(self, rows, batch_size):
+        """Находит объекты пачки одним запросом и одним bulk_create
+        добавляет недостающие. Возвращает словарь ключ -> pk
+        и число созданных объектов."""
+        rows = {self.key(row): row for row in rows}
+        found = self.fetch(rows)
+        missing = [self.build(row) for key, row in rows.items()
+                   if key not in found]
+        if missing:
+            self.model.objects.bulk_create(
+                missing, batch_size=batch_size, ignore_conflicts=True)
+            found = self.fetch(rows)
+        conflicts = [key for key in rows if key not in found]
+        if conflicts:
+            raise ValueError(
+                f'{self.model._meta.verbose_name_plural} не созданы '
+                f'из-за конфликта с существующими: {conflicts}')
+        return found, len(missing)
+
+
+USERS = NaturalKey(User, ('email',), lambda row: User(
+    password=make_password(None),
+    **{field: row[field] for field in USER_FIELDS}))
+TAGS = NaturalKey(Tag, ('slug',), lambda row: Tag(
+    **{field: row[field] for field in TAG_FIELDS}))
+INGREDIENTS = NaturalKey(
+    Ingredient, ('name', 'measurement_unit'),
+    lambda row: Ingredient(name=row['name'],
+                           measurement_unit=row['measurement_unit']))
+
+
+def save_image(row):
+    """Сохраняет вложенное изображение; одинаковые файлы
+    хранилище по хешу содержимого записывает один раз."""
+    storage = Recipe._meta.get_field('image').storage
+    name = row['image'] or 'recipes/image'
+    return storage.save(
+        os.path.join('recipes', os.path.basename(name)),
+        ContentFile(base64.b64decode(row['image_data'])))
+
+
+def save_recipes(rows, users, batch_size):
+    """Создает рецепты с новыми uid и обновляет поля остальных.
+    Возвращает рецепты в порядке строк и число созданных."""
+    existing = dict(Recipe.objects.filter(
+        uid__in=[row['uid'] for row in rows]).values_list('uid', 'pk'))
+    recipes = []
+    for row in rows:
+        uid = uuid.UUID(row['uid'])
+        image = save_image(row) if row.get('image_data') else row['image']
+        recipes.append(Recipe(
+            pk=existing.get(uid), uid=uid, name=row['name'],
+            text=row['text'], cooking_time=row['cooking_time'], image=image,
+            author_id=users[USERS.key(row['author'])]))
+    created = [recipe for recipe in recipes if recipe.pk is None]
+    if created:
+        Recipe.objects.bulk_create(created, batch_size=batch_size)
+        ids = dict(Recipe.objects.filter(
+            uid__in=[recipe.uid for recipe in created]
+        ).values_list('uid', 'pk'))
+        for recipe in created:
+            recipe.pk = ids[recipe.uid]
+    # bulk_create выставляет pub_date текущим временем (auto_now),
+    # bulk_update записывает значения как есть.
+    for recipe, row in zip(recipes, rows):
+        recipe.pub_date = parse_datetime(row['pub_date'])
+    Recipe.objects.bulk_update(recipes, RECIPE_FIELDS, batch_size=batch_size)
+    return recipes, len(created)
+
+
+def load_recipes(rows, batch_size):
+    """Загружает пачку рецептов, сопоставляя их с базой по uid: найденные
+    обновляются, остальные создаются, теги и ингредиенты каждого рецепта
+    заменяются составом из выгрузки. Рецепты с другими uid не
+    затрагиваются, повторная загрузка той же пачки ничего не дублирует.
+    Возвращает число созданных строк по видам объектов."""
+    rows = list({row['uid']: row for row in rows}.values())
+    users, users_created = USERS.resolve(
+        (row['author'] for row in rows), batch_size)
+    tags, tags_created = TAGS.resolve(
+        (tag for row in rows for tag in row['tags']), batch_size)
+    ingredients, ingredients_created = INGREDIENTS.resolve(
+        (item for row in rows for item in row['ingredients']), batch_size)
+    recipes, recipes_created = save_recipes(rows, users, batch_size)
+
+    recipe_ids = [recipe.pk for recipe in recipes]
+    Recipe.tags.through.objects.filter(recipe_id__in=recipe_ids).delete()
+    RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).delete()
+    Recipe.tags.through.objects.bulk_create((
+        Recipe.tags.through(recipe_id=recipe.pk, tag_id=tags[TAGS.key(tag)])
+        for recipe, row in zip(recipes, rows) for tag in row['tags']
+    ), batch_size=batch_size)
+    RecipeIngredient.objects.bulk_create((
+        RecipeIngredient(
+            recipe_id=recipe.pk,
+            ingredient_id=ingredients[INGREDIENTS.key(item)],
+            amount=item['amount'])
+        for recipe, row in zip(recipes, rows) for item in row['ingredients']
+    ), batch_size=batch_size)
+    return {
+        'recipes': recipes_created,
+        'users': users_created,
+        'tags': tags_created,
+        'ingredients': ingredients_created,
+    }
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+
+from django.db.models import (F, FloatField, Func, OuterRef, Subquery, Sum,
+                              Value)
+from django.db.models.functions import Coalesce, Power
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+# Вклад события растет экспоненциально от фиксированной эпохи: порядок
+# рецептов по сумме вкладов совпадает с порядком по затухающему рейтингу,
+# поэтому рейтинг можно наращивать по одному событию без пересчета.
+# float вмещает около 1000 периодов полураспада (~19 лет) от эпохи;
+# после переноса EPOCH нужно выполнить update_trending.
+EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+HALF_LIFE = timedelta(days=7)
+WEIGHTS = {
+    Favorite: 2.0,
+    ShoppingCart: 1.0,
+}
+
+
+class EpochSeconds(Func):
+    """Число секунд от начала эпохи Unix для даты со временем."""
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)'
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite хранит дату строкой в UTC; 2440587.5 - юлианский день
+        # 1970-01-01
+        return self.as_sql(
+            compiler, connection,
+            template="(julianday(%(expressions)s) - 2440587.5) * 86400.0",
+            **extra_context)
+
+
+def event_score(model, created):
+    return WEIGHTS[model] * 2 ** ((created - EPOCH) / HALF_LIFE)
+
+
+def change_score(recipe_id, delta):
+    Recipe.objects.filter(pk=recipe_id).update(
+        trending_score=F('trending_score') + delta)
+
+
+def event_scores(model):
+    """Подзапрос: сумма вкладов событий модели для рецепта, как в
+    event_score, но вычисленная в базе."""
+    age = (EpochSeconds('created')
+           - Value(EPOCH.timestamp(), output_field=FloatField()))
+    score = Value(WEIGHTS[model], output_field=FloatField()) * Power(
+        Value(2.0, output_field=FloatField()),
+        age / Value(HALF_LIFE.total_seconds(), output_field=FloatField()))
+    scores = model.objects.filter(
+        recipe=OuterRef('pk')
+    ).order_by().values('recipe').annotate(score=Sum(score)).values('score')
+    return Coalesce(Subquery(scores, output_field=FloatField()), Value(0.0))
+
+
+def rebuild_scores():
+    """Пересчитывает рейтинг всех рецептов по событиям избранного и
+    списка покупок одним UPDATE; исправляет накопленную ошибку
+    округления."""
+    return Recipe.objects.update(trending_score=sum(
+        (event_scores(model) for model in WEIGHTS), Value(0.0)))
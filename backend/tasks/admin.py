@@ -0,0 +1,9 @@
+from django.contrib.admin import ModelAdmin, register
+from tasks.models import Task
+
+
+@register(Task)
+class TaskAdmin(ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'created', 'run_after')
+    list_filter = ('name', 'status')
+    search_fields = ('idempotency_key',)
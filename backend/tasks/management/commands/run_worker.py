@@ -0,0 +1,35 @@
+import time
+
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+from tasks.queue import purge, run_next
+
+PURGE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = ('Выполняет фоновые задачи из очереди в базе данных и раз '
+            'в час удаляет старые завершенные задачи.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='пауза между опросами пустой очереди, с')
+        parser.add_argument('--once', action='store_true',
+                            help='выполнить все готовые задачи и выйти')
+
+    def handle(self, *args, **options):
+        purged = None
+        while True:
+            close_old_connections()
+            if purged is None or time.monotonic() - purged > PURGE_INTERVAL:
+                deleted = purge()
+                if deleted:
+                    self.stdout.write(f'Удалено старых задач: {deleted}')
+                purged = time.monotonic()
+            task = run_next()
+            if task is not None:
+                self.stdout.write(f'{task.name} #{task.pk}')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 22:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='rerun',
+            field=models.BooleanField(default=False, verbose_name='Повторить после выполнения'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+import json
+
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(
+        verbose_name='Задача',
+        max_length=100
+    )
+    kwargs = models.TextField(
+        verbose_name='Аргументы (JSON)',
+        default='{}'
+    )
+    idempotency_key = models.CharField(
+        verbose_name='Ключ идемпотентности',
+        max_length=255,
+        unique=True,
+        null=True,
+        blank=True
+    )
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=16,
+        choices=STATUSES,
+        default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='Попыток',
+        default=0
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='Максимум попыток',
+        default=3
+    )
+    run_after = models.DateTimeField(
+        verbose_name='Выполнить после',
+        default=timezone.now
+    )
+    rerun = models.BooleanField(
+        verbose_name='Повторить после выполнения',
+        default=False
+    )
+    started = models.DateTimeField(
+        verbose_name='Начало выполнения',
+        null=True,
+        blank=True
+    )
+    result = models.TextField(
+        verbose_name='Результат (JSON)',
+        blank=True
+    )
+    error = models.TextField(
+        verbose_name='Ошибка',
+        blank=True
+    )
+    created = models.DateTimeField(
+        verbose_name='Создана',
+        auto_now_add=True
+    )
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = (
+            models.Index(fields=('status', 'run_after'),
+                         name='task_status_run_after_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
+
+    def get_kwargs(self):
+        return json.loads(self.kwargs)
+
+    def get_result(self):
+        return json.loads(self.result) if self.result else None
@@ -0,0 +1,175 @@
+import json
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, CharField, F, Q, Value, When
+from django.utils import timezone
+from tasks.models import Task
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+RETRY_DELAY = timedelta(seconds=30)
+RUNNING_TIMEOUT = timedelta(minutes=10)
+
+executor = None
+
+
+def task(name):
+    """Регистрирует функцию как фоновую задачу с именем name."""
+    def decorator(function):
+        REGISTRY[name] = function
+        return function
+    return decorator
+
+
+def get_executor():
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            max_workers=settings.TASKS_LOCAL_THREADS,
+            thread_name_prefix='tasks')
+    return executor
+
+
+def enqueue(name, kwargs=None, idempotency_key=None, max_attempts=3,
+            repeat=False):
+    """Ставит задачу в очередь. Повторный вызов с тем же ключом
+    идемпотентности возвращает уже существующую задачу; упавшая задача
+    при этом перезапускается, а с repeat=True — и выполненная, и
+    выполняющаяся (после завершения): так пересчеты по меняющимся
+    данным сливаются в одну задачу на объект."""
+    if name not in REGISTRY:
+        raise KeyError(f'Неизвестная задача {name}')
+    defaults = {
+        'name': name,
+        'kwargs': json.dumps(kwargs or {}),
+        'max_attempts': max_attempts,
+    }
+    if idempotency_key is None:
+        task = Task.objects.create(**defaults)
+    else:
+        task, created = Task.objects.get_or_create(
+            idempotency_key=idempotency_key, defaults=defaults)
+        if not created:
+            rearm(task, repeat)
+    if task.status == Task.PENDING and settings.TASKS_LOCAL_THREADS:
+        task_id = task.pk
+        transaction.on_commit(
+            lambda: get_executor().submit(run_local, task_id))
+    return task
+
+
+def rearm(task, repeat):
+    """Возвращает в очередь упавшую задачу, а с repeat — и выполненную.
+    Выполняющуюся при repeat помечает флагом rerun: ее проход мог уже
+    прочитать старые данные, поэтому после завершения она встанет в
+    очередь снова. Каждая попытка — условный UPDATE по статусу; если
+    статус успел смениться, решение принимается заново."""
+    finished = (Task.FAILED, Task.DONE) if repeat else (Task.FAILED,)
+    while True:
+        if task.status in finished:
+            changed = Task.objects.filter(
+                pk=task.pk, status=task.status
+            ).update(status=Task.PENDING, attempts=0, error='',
+                     run_after=timezone.now())
+        elif repeat and task.status == Task.RUNNING:
+            changed = Task.objects.filter(
+                pk=task.pk, status=Task.RUNNING).update(rerun=True)
+        else:
+            return
+        task.refresh_from_db()
+        if changed:
+            return
+
+
+def complete(task, status, **changes):
+    """Записывает итог выполнения. Задача, которую во время выполнения
+    поставили в очередь повторно (rerun), возвращается в очередь с
+    нулевым счетчиком попыток в том же UPDATE, без гонки с enqueue."""
+    rerun = When(rerun=True, then=Value(Task.PENDING))
+    Task.objects.filter(pk=task.pk).update(
+        status=Case(rerun, default=Value(status),
+                    output_field=CharField()),
+        attempts=Case(When(rerun=True, then=Value(0)),
+                      default=F('attempts')),
+        rerun=False, **changes)
+
+
+def claimable():
+    now = timezone.now()
+    return Task.objects.filter(
+        Q(status=Task.PENDING, run_after__lte=now)
+        | Q(status=Task.RUNNING, started__lt=now - RUNNING_TIMEOUT)
+    )
+
+
+def claim(queryset):
+    """Захватывает первую подходящую задачу условным UPDATE, поэтому
+    несколько воркеров и потоков не выполнят одну задачу дважды.
+    Зависшая задача, исчерпавшая попытки, помечается упавшей."""
+    for candidate in queryset.order_by('run_after', 'pk')[:10]:
+        exhausted = (candidate.status == Task.RUNNING
+                     and candidate.attempts >= candidate.max_attempts)
+        if exhausted:
+            changes = {'status': Task.FAILED, 'error': (
+                f'Не завершилась за {RUNNING_TIMEOUT} '
+                f'с {candidate.attempts} попыток')}
+        else:
+            changes = {'status': Task.RUNNING, 'started': timezone.now(),
+                       'attempts': candidate.attempts + 1}
+        claimed = Task.objects.filter(
+            pk=candidate.pk, status=candidate.status,
+            started=candidate.started
+        ).update(**changes)
+        if claimed and not exhausted:
+            candidate.refresh_from_db()
+            return candidate
+    return None
+
+
+def execute(task):
+    try:
+        result = REGISTRY[task.name](**task.get_kwargs())
+    except Exception:
+        logger.exception('Задача %s завершилась ошибкой', task)
+        retry = task.attempts < task.max_attempts
+        complete(task, Task.PENDING if retry else Task.FAILED,
+                 run_after=timezone.now() + RETRY_DELAY * task.attempts,
+                 error=traceback.format_exc())
+        return False
+    complete(task, Task.DONE, result=json.dumps(result), error='')
+    return True
+
+
+def run_local(task_id):
+    """Выполняет задачу в пуле потоков процесса, если ее еще
+    не захватил воркер."""
+    close_old_connections()
+    try:
+        task = claim(claimable().filter(pk=task_id))
+        if task is not None:
+            execute(task)
+    finally:
+        close_old_connections()
+
+
+def run_next():
+    task = claim(claimable())
+    if task is None:
+        return None
+    execute(task)
+    return task
+
+
+def purge():
+    """Удаляет выполненные и упавшие задачи старше TASKS_KEEP_HOURS
+    часов; файлы результатов удаляют обработчики post_delete."""
+    cutoff = timezone.now() - timedelta(hours=settings.TASKS_KEEP_HOURS)
+    deleted, _ = Task.objects.filter(
+        status__in=(Task.DONE, Task.FAILED), created__lt=cutoff).delete()
+    return deleted
@@ -17,6 +17,16 @@ class User(AbstractUser):
         verbose_name='Фамилия',
         max_length=150,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
@@ -65,3 +75,7 @@ class Follow(models.Model):
                 fields=['author', 'user'],
                 name='unique_follower')
         ]
+        indexes = [
+            models.Index(fields=['user', 'author'],
+                         name='follow_user_author_idx')
+        ]